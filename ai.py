@@ -1,6 +1,12 @@
-import random
+import random, time
+from collections import namedtuple
 from math import inf
-from globals import TILES_IN_ROW
+from globals import TILES_IN_ROW, piece_values
+from chess_piece import EMPTY, PAWN, piece_char
+import evaluation
+from chess_move import TO_SHIFT, SQUARE_MASK, CAPTURE_FLAG, EN_PASSANT_FLAG, MoveList, move_promotion, is_tactical
+from transposition import EXACT, LOWER_BOUND, UPPER_BOUND
+from move_ordering import MoveOrderer, order_value, MAX_PLY
 
 # def random_move(board):
 #     moves = board.get_possible_moves()
@@ -13,13 +19,12 @@ def output_board(board, maximizing_color, depth):
     f = open("board-output.txt", "a")
     f.write(f"Depth: {depth}, Evaluation: {evaluate(board, maximizing_color)}\n")
     
-    # Implement this function to print your board in a readable format
-    # For example, if your board is a 2D list, you can loop through and print each row
+    # Prints the squares of the position one row at a time
     for row in range(0, TILES_IN_ROW):
         for col in range(0, TILES_IN_ROW):
-            tile = board.tiles[row][col]
-            if tile.piece:
-                f.write(f"[{tile.piece.piece_c}]")
+            piece = board.piece_at((col, row))
+            if piece != EMPTY:
+                f.write(f"[{piece_char(piece)}]")
             else:
                 f.write("[ ]")
         f.write("\n")
@@ -38,58 +43,506 @@ def print_moves(moves):
         print() # For newline
     print("------------------------------------------------------------------")
 
+MATE_SCORE = 100000    # Larger than any material swing so a checkmate always outweighs the evaluation
+TABLE_WIN_SCORE = MATE_SCORE // 4  # Score of a won endgame table position, less the plies to mate so faster mates score higher
+
+NULL_MOVE_MIN_DEPTH = 3 # Null move pruning is only tried with at least this much depth left
+NULL_MOVE_REDUCTION = 2 # How much shallower the null move is searched, one more above depth 6
+LMR_MIN_DEPTH = 3       # Late move reductions are only used with at least this much depth left
+LMR_FULL_DEPTH_MOVES = 3 # The number of moves at a node that are never reduced
+ASPIRATION_MIN_DEPTH = 3 # Iterations from this depth on start with a window around the score of the last one
+ASPIRATION_WINDOW = 10  # Half the width of that window, a pawn either side
+ASPIRATION_MAX_WINDOW = 160 # Past this the window is opened all the way on the side that failed
+QSEARCH_NODE_CAP = 2000 # Most nodes the quiescence search can visit below a single leaf
+DELTA_MARGIN = 20       # Room for the positional points a capture can also earn when delta pruning
+
 def evaluate(board, maximizing_color):
-    if maximizing_color == "w":
-        return board.white_score - board.black_score
-    else:
-        return board.black_score - board.white_score
+    score = evaluation.evaluate(board)
+    return score if maximizing_color == "w" else -score
 
-def minimax(board, depth, alpha, beta, maximizing_player, maximizing_color):
-    if depth == 0 or board.game_over:
-        return None, evaluate(board, maximizing_color)  # Only returns the evaluation at depth 0
-    
-    possible_moves = board.get_possible_moves(board.active_player) # Give this parameter so that the 
+# Raised from inside minimax when the time or node budget of the search has run out
+class SearchTimeout(Exception):
+    pass
+
+# Holds what the search needs to share between nodes, so it doesn't have to be threaded through every call
+class SearchState:
+    CHECK_TIME_EVERY = 1024  # Nodes between looking at the clock
+
+    def __init__(self, tt=None, deadline=None, node_limit=None):
+        self.tt = tt    # transposition.TranspositionTable, the search runs without one if it's None
+        self.nodes = 0
+
+        # The budget, deadline is a time.perf_counter() value. Neither is enforced until can_stop is set
+        # so that the first iteration of iterative deepening always finishes and there's a move to play
+        self.deadline = deadline
+        self.node_limit = node_limit
+        self.can_stop = False
+        self.stop = None    # Function that returns True once the search has been asked to stop early, None if it can't be
+
+        # The best line of the last finished iteration and how many moves had been made before the search started,
+        # the difference between that and the current number of past moves is the ply of a node
+        self.pv_line = []
+        self.root_ply = 0
+        self.root_moves = None  # Only these moves are searched at the root when set, used to split the root between processes
+        self.endgame_tables = None  # endgame_tables.EndgameTables probed below the root, None to search every ending
+
+        # Triangular table of principal variations, pv_table[ply] is the best line found from the node at that ply
+        self.pv_table = [[] for _ in range(MAX_PLY + 1)]
+
+        # A move list for every ply that the nodes reuse instead of allocating their own
+        self.move_lists = [MoveList() for _ in range(MAX_PLY + 1)]
+
+        self.orderer = MoveOrderer()
+
+        # Selective search switches and their counters, so each can be compared on and off
+        self.null_move = True
+        self.lmr = True
+        self.pvs = True
+        self.aspiration = True
+        self.null_move_cutoffs = 0
+        self.reductions = 0
+        self.re_searches = 0
+        self.pvs_re_searches = 0
+        self.aspiration_re_searches = 0
+
+        # Quiescence search settings, qnode_cap is how many nodes the capture search below one leaf can visit
+        self.quiescence = True
+        self.qnode_cap = QSEARCH_NODE_CAP
+        self.qnodes_left = 0
+        self.qnodes = 0
+        self.qsearch_ply = 0    # Ply of the leaf the current quiescence search started from
+
+    # Fn: move_list()
+    # Brief: The move list for a ply, the quiescence search can go past MAX_PLY and gets a new one there
+    def move_list(self, ply):
+        return self.move_lists[ply] if ply <= MAX_PLY else MoveList()
+
+    # Fn: check_limits()
+    # Brief: Stops the search by raising SearchTimeout if it's gone over its budget or been told to stop
+    def check_limits(self):
+        if not self.can_stop:
+            return
+        if self.node_limit is not None and self.nodes >= self.node_limit:
+            raise SearchTimeout()
+        if self.nodes % self.CHECK_TIME_EVERY == 0:
+            if self.deadline is not None and time.perf_counter() >= self.deadline:
+                raise SearchTimeout()
+            if self.stop is not None and self.stop():
+                raise SearchTimeout()
+
+SearchResult = namedtuple("SearchResult", ["best_move", "score", "depth", "nodes", "time", "first_move_cutoff_rate",
+                                           "null_move_cutoffs", "reductions", "re_searches", "pv",
+                                           "pvs_re_searches", "aspiration_re_searches"])
 
-    # If there's no moves, just evauluate the board and return
-    if len(possible_moves) == 0 or possible_moves == {} or possible_moves == None:
+# What iterative deepening reports after each iteration it finishes, so the progress of a search can be shown while it runs
+SearchInfo = namedtuple("SearchInfo", ["depth", "score", "pv", "nodes", "time"])
+
+# Fn: is_mate_score()
+# Brief: Checks if a score came from a checkmate rather than the evaluation
+def is_mate_score(score):
+    return abs(score) > MATE_SCORE // 2
+
+# Fn: table_score()
+# Brief: Turns the result of an endgame table probe into a score
+# Params: - result: Tuple of the winning color (None for a draw) and the plies to mate, from EndgameTables.probe
+#         - maximizing_color: The color the score is for
+def table_score(result, maximizing_color):
+    winner, plies = result
+    if winner is None:
+        return 0
+    return TABLE_WIN_SCORE - plies if winner == maximizing_color else plies - TABLE_WIN_SCORE
+
+# Fn: score_to_tt()
+# Brief: Mate scores include the remaining depth of the mated node, so they're stored relative to the
+# node being stored to stay correct when the position is reached at a different depth
+def score_to_tt(score, depth):
+    if is_mate_score(score):
+        return score - depth if score > 0 else score + depth
+    return score
+
+# Fn: score_from_tt()
+# Brief: The inverse of score_to_tt for the depth of the node that probed the table
+def score_from_tt(score, depth):
+    if is_mate_score(score):
+        return score + depth if score > 0 else score - depth
+    return score
+
+# Fn: null_window_search()
+# Brief: Searches the position after a move with a window of width one on the bound the node has to beat. It's
+# cheaper than a full window but only tells if the move beats the bound, not by how much
+# Params: - maximizing_player: If the node the move was made from is a maximizing one
+# Return: The score of the search, above alpha (or below beta for a minimizing node) if the move beats the bound
+def null_window_search(board, depth, alpha, beta, maximizing_player, maximizing_color, state):
+    if maximizing_player:
+        return minimax(board, depth, alpha, alpha + 1, False, maximizing_color, state)[1]
+    return minimax(board, depth, beta - 1, beta, True, maximizing_color, state)[1]
+
+def minimax(board, depth, alpha, beta, maximizing_player, maximizing_color, state=None):
+    ply = 0
+    if state is not None:
+        state.nodes += 1
+        state.check_limits()
+        ply = len(board.past_moves) - state.root_ply
+        if ply <= MAX_PLY:
+            state.pv_table[ply] = []
+
+    if board.game_over:
         return None, evaluate(board, maximizing_color)
 
+    # Endings in the tables have an exact result, so there's nothing left to search below them
+    if state is not None and state.endgame_tables is not None and ply > 0:
+        result = state.endgame_tables.probe(board)
+        if result is not None:
+            return None, table_score(result, maximizing_color)
+
+    if depth == 0:
+        # Keep searching captures so the evaluation isn't taken in the middle of an exchange
+        if state is not None and state.quiescence:
+            state.nodes -= 1    # The quiescence search counts this node itself
+            state.qnodes_left = state.qnode_cap
+            state.qsearch_ply = ply
+            return None, quiesce(board, alpha, beta, maximizing_player, maximizing_color, state)
+        return None, evaluate(board, maximizing_color)  # Only returns the evaluation at depth 0
+
+    # Use what's already known about this position, the stored best move is searched first even if the score can't be used.
+    # A root that only searches some of its moves doesn't use or store a score, it isn't the score of the position
+    tt = state.tt if state is not None else None
+    tt_move = None
+    split_root = state is not None and ply == 0 and state.root_moves is not None
+    if tt is not None and not split_root:
+        entry = tt.probe(board.hash)
+        if entry is not None:
+            tt_move = entry.best_move
+            if entry.depth >= depth:
+                score = score_from_tt(entry.score, depth)
+                if (entry.bound == EXACT
+                    or (entry.bound == LOWER_BOUND and score >= beta)
+                    or (entry.bound == UPPER_BOUND and score <= alpha)):
+                    return tt_move, score
+
+    in_check = board.in_check(board.active_player)
+
+    # Null move pruning, if passing the turn still leaves the side to move past the window then a real move
+    # would too, so the node is cut without searching it. Skipped when in check, straight after another null move,
+    # and when the side to move only has pawns left since that's when passing can be better than any move (zugzwang)
+    if (state is not None and state.null_move and ply > 0 and depth >= NULL_MOVE_MIN_DEPTH and not in_check
+        and not board.past_moves[-1].null and board.has_non_pawn_material(board.active_player)):
+        static_eval = evaluate(board, maximizing_color)
+        reduction = NULL_MOVE_REDUCTION + (1 if depth > 6 else 0)
+        if maximizing_player and static_eval >= beta:
+            board.make_null_move()
+            score = minimax(board, max(0, depth - 1 - reduction), beta - 1, beta, False, maximizing_color, state)[1]
+            board.unmake_null_move()
+            if score >= beta and not is_mate_score(score):
+                state.null_move_cutoffs += 1
+                return None, score
+        elif not maximizing_player and static_eval <= alpha:
+            board.make_null_move()
+            score = minimax(board, max(0, depth - 1 - reduction), alpha, alpha + 1, True, maximizing_color, state)[1]
+            board.unmake_null_move()
+            if score <= alpha and not is_mate_score(score):
+                state.null_move_cutoffs += 1
+                return None, score
+
+    moves = board.generate_moves(board.active_player, state.move_list(ply) if state is not None else MoveList())
+
+    # If there's no moves it's either checkmate or stalemate, which the attack tables can tell apart cheaply.
+    # The remaining depth is added to the mate score so that quicker mates are preferred
+    if moves.count == 0:
+        if not in_check:
+            return None, 0
+        if board.active_player == maximizing_color:
+            return None, -(MATE_SCORE + depth)
+        return None, MATE_SCORE + depth
+
+    if state is not None:
+        # The best line of the previous iteration goes before everything else, then the move from the table
+        hash_move = tt_move
+        if ply < len(state.pv_line) and state.pv_line[ply] in moves:
+            hash_move = state.pv_line[ply]
+        moves = state.orderer.order_moves(board, moves, ply, hash_move)
+        if split_root:
+            moves = [move for move in moves if move in state.root_moves]
+    else:
+        moves = moves.to_list()
+
+    alpha_og = alpha
+    beta_og = beta
     best_move = None
+    best_eval = -inf if maximizing_player else inf # Worse possible scenario
 
-    # Find maximum value
-    if maximizing_player:
-        max_eval = -inf # Worse possible scenario
-
-        for from_move in possible_moves:    # Iterate over all the keys
-            to_moves = possible_moves[from_move]
-            for to_move in to_moves:
-                board.make_move((from_move, to_move))
-                current_eval = minimax(board, depth - 1, alpha, beta, False, maximizing_color)[1]
-                board.unmake_move()
-                if current_eval > max_eval:
-                    max_eval = current_eval
-                    best_move = (from_move, to_move)
-                    
-                alpha = max(alpha, current_eval)
-                if beta <= alpha:
-                    return best_move, max_eval  
-        return best_move, max_eval
-    # Find minumum value
+    for move_number, move in enumerate(moves):
+        # Late move reductions, quiet moves far down the ordered list rarely turn out best so they're searched
+        # a ply shallower with a null window first, and only searched properly if that beats the window
+        reduce = (state is not None and state.lmr and depth >= LMR_MIN_DEPTH and move_number >= LMR_FULL_DEPTH_MOVES
+                  and not in_check and not is_tactical(move) and not state.orderer.is_killer(move, ply))
+
+        board.make_move(move)
+        current_eval = None
+        if reduce and not board.in_check(board.active_player):
+            state.reductions += 1
+            current_eval = null_window_search(board, depth - 2, alpha, beta, maximizing_player, maximizing_color, state)
+            if current_eval > alpha if maximizing_player else current_eval < beta:
+                state.re_searches += 1
+                current_eval = None
+
+        # Principal variation search, once the first move has set the bound the rest are expected to fail to beat it,
+        # so they're proven worse with a null window and only the ones that land inside the window are searched again
+        if current_eval is None and move_number > 0 and state is not None and state.pvs:
+            current_eval = null_window_search(board, depth - 1, alpha, beta, maximizing_player, maximizing_color, state)
+            if alpha < current_eval < beta:
+                state.pvs_re_searches += 1
+                current_eval = None
+
+        if current_eval is None:
+            current_eval = minimax(board, depth - 1, alpha, beta, not maximizing_player, maximizing_color, state)[1]
+        board.unmake_move()
+
+        # Find maximum value
+        if maximizing_player:
+            if current_eval > best_eval:
+                best_eval = current_eval
+                best_move = move
+            if current_eval > alpha:
+                alpha = current_eval
+                update_pv(state, ply, move)
+        # Find minumum value
+        else:
+            if current_eval < best_eval:
+                best_eval = current_eval
+                best_move = move
+            if current_eval < beta:
+                beta = current_eval
+                update_pv(state, ply, move)
+
+        if beta <= alpha:
+            if state is not None:
+                state.orderer.record_cutoff(board, move, move_number, depth, ply)
+            break
+
+    if tt is not None and not split_root:
+        # The bound is the same for both players since the scores are always from the maximizing colors side
+        if best_eval <= alpha_og:
+            bound = UPPER_BOUND
+        elif best_eval >= beta_og:
+            bound = LOWER_BOUND
+        else:
+            bound = EXACT
+        tt.store(board.hash, depth, score_to_tt(best_eval, depth), bound, best_move)
+
+    return best_move, best_eval
+
+# Fn: update_pv()
+# Brief: A move has raised the bound of the node at ply, so the line from that node becomes the move followed by the
+# line its child found
+def update_pv(state, ply, move):
+    if state is not None and ply < MAX_PLY:
+        state.pv_table[ply] = [move] + state.pv_table[ply + 1]
+
+# Fn: capture_gain()
+# Brief: The most the evaluation can gain from a capture or promotion, used for delta pruning
+def capture_gain(board, move):
+    gain = DELTA_MARGIN
+    if move & CAPTURE_FLAG:
+        # The pawn taken en passant isn't on the to square
+        gain += order_value(PAWN if move & EN_PASSANT_FLAG else board.squares[(move >> TO_SHIFT) & SQUARE_MASK])
+    promotion = move_promotion(move)
+    if promotion != EMPTY:
+        # The pawn turns into the new piece, so it's only worth the difference
+        gain += piece_values[piece_char(promotion)] - piece_values["p"]
+    return gain
+
+# Fn: quiesce()
+# Brief: Searches only captures and promotions from a leaf of minimax until the position is quiet. The side to move
+# can always stand pat on the static evaluation instead of capturing (unless it's in check, then every move is searched),
+# and captures that can't bring the score back up to alpha (or down to beta) are skipped by delta pruning
+# Params: - board: The position
+#         - alpha, beta: The window of minimax
+#         - maximizing_player: If the side to move is the maximizing color
+#         - maximizing_color: The color the scores are from
+#         - state: The SearchState, state.qnodes_left bounds how far this can go
+# Return: The score of the position
+def quiesce(board, alpha, beta, maximizing_player, maximizing_color, state):
+    state.nodes += 1
+    state.qnodes += 1
+    state.qnodes_left -= 1
+    state.check_limits()
+
+    stand_pat = evaluate(board, maximizing_color)
+    # Once the cap is reached the evaluation is taken even in check, evasions can branch as much as any other moves
+    if state.qnodes_left <= 0:
+        return stand_pat
+
+    ply = len(board.past_moves) - state.root_ply
+    in_check = board.in_check(board.active_player)
+    if in_check:
+        moves = board.generate_moves(board.active_player, state.move_list(ply))
+        if moves.count == 0:
+            # Carries on from the mate scores of minimax, which add the depth left, past the leaf the depth left
+            # goes below zero so quicker mates still score higher
+            depth = state.qsearch_ply - ply
+            return -(MATE_SCORE + depth) if maximizing_player else MATE_SCORE + depth
+        best_eval = -inf if maximizing_player else inf
     else:
-        min_eval = inf # Worse possible scenario
-        
-        for from_move in possible_moves:    # Iterate over all the keys
-            to_moves = possible_moves[from_move]
-            for to_move in to_moves:
-                board.make_move((from_move, to_move))
-                current_eval = minimax(board, depth - 1, alpha, beta, True, maximizing_color)[1]
-                board.unmake_move()
-                if current_eval < min_eval:
-                    min_eval = current_eval
-                    best_move = (from_move, to_move)
-
-                beta = min(beta, current_eval)
-                if beta <= alpha:
-                    return best_move, min_eval
-
-        return best_move, min_eval
\ No newline at end of file
+        moves = board.generate_moves(board.active_player, state.move_list(ply), True)
+        best_eval = stand_pat
+        if maximizing_player:
+            if stand_pat >= beta:
+                return stand_pat
+            alpha = max(alpha, stand_pat)
+        else:
+            if stand_pat <= alpha:
+                return stand_pat
+            beta = min(beta, stand_pat)
+
+    for move in state.orderer.order_moves(board, moves, ply):
+        if not in_check:
+            gain = capture_gain(board, move)
+            if maximizing_player and stand_pat + gain <= alpha:
+                continue
+            if not maximizing_player and stand_pat - gain >= beta:
+                continue
+
+        board.make_move(move)
+        current_eval = quiesce(board, alpha, beta, not maximizing_player, maximizing_color, state)
+        board.unmake_move()
+
+        if maximizing_player:
+            best_eval = max(best_eval, current_eval)
+            alpha = max(alpha, current_eval)
+        else:
+            best_eval = min(best_eval, current_eval)
+            beta = min(beta, current_eval)
+        if beta <= alpha:
+            break
+
+    return best_eval
+
+# Fn: get_pv_line()
+# Brief: Follows the best moves stored in the transposition table from the current position to rebuild the line the
+# search expects to be played
+# Params: - board: The position the search was run on
+#         - tt: The transposition table the search used
+#         - max_length: The most moves to follow, stops the line looping forever on repeated positions
+#         - line: Moves already known to start the line, the table is followed from the end of them
+# Return: List of moves
+def get_pv_line(board, tt, max_length, line=None):
+    line = list(line) if line else []
+    for move in line:
+        board.make_move(move)
+
+    while len(line) < max_length:
+        entry = tt.probe(board.hash)
+        if entry is None or entry.best_move is None:
+            break
+        if entry.best_move not in board.generate_moves(board.active_player, MoveList()):
+            break
+        board.make_move(entry.best_move)
+        line.append(entry.best_move)
+
+    for _ in line:
+        board.unmake_move()
+    return line
+
+# Fn: allocate_time()
+# Brief: Works out how long the ai can think about one move in a timed game
+# Params: - remaining: Seconds left on the ais clock
+#         - increment: Seconds added to the clock after every move
+#         - moves_to_go: Moves until the next time control, None if the rest of the game has to be played on the clock
+# Return: The number of seconds to search for
+def allocate_time(remaining, increment=0, moves_to_go=None):
+    moves_left = moves_to_go if moves_to_go else 30    # Assume the game goes on for another 30 moves
+    allocated = remaining / moves_left + increment * 0.8
+    # Never use more than half of what's left so that one hard position can't lose the game on time
+    return max(0.01, min(allocated, remaining * 0.5))
+
+# Fn: iterative_deepening()
+# Brief: Searches to depth 1, 2, 3 and so on until the time or node budget runs out, each iteration ordering its
+# moves from the best line of the one before. An iteration that runs out of budget is thrown away
+# Params: - board: The position to search, it's left unchanged
+#         - maximizing_color: The color the search is finding a move for
+#         - time_limit: Seconds the search can take, None for no limit
+#         - node_limit: Nodes the search can visit, None for no limit
+#         - max_depth: The deepest iteration to run
+#         - tt: Optional transposition table, shared across searches for the same color
+#         - null_move: Turns null move pruning on or off
+#         - lmr: Turns late move reductions on or off
+#         - pvs: Turns principal variation search on or off
+#         - aspiration: Turns aspiration windows on or off
+#         - root_moves: Only search these packed moves at the root, None for every legal move
+#         - stop: Function polled during the search, once it returns True the search ends as if it ran out of time
+#         - on_iteration: Function called with a SearchInfo every time an iteration finishes
+#         - endgame_tables: endgame_tables.EndgameTables to take the result of small endings from, None to search them
+# Return: SearchResult of the last completed iteration
+def iterative_deepening(board, maximizing_color, time_limit=None, node_limit=None, max_depth=64, tt=None,
+                        null_move=True, lmr=True, pvs=True, aspiration=True, root_moves=None, stop=None,
+                        on_iteration=None, endgame_tables=None):
+    start = time.perf_counter()
+    deadline = start + time_limit if time_limit is not None else None
+    state = SearchState(tt, deadline, node_limit)
+    state.stop = stop
+    state.root_ply = len(board.past_moves)
+    state.null_move = null_move
+    state.lmr = lmr
+    state.pvs = pvs
+    state.aspiration = aspiration
+    state.root_moves = set(root_moves) if root_moves is not None else None
+    state.endgame_tables = endgame_tables
+    # When the root is in the tables every move leads to a position the tables also know, so one ply finds the best
+    in_tables = endgame_tables is not None and endgame_tables.probe(board) is not None
+
+    best_move = None
+    best_score = None
+    best_line = []
+    completed_depth = 0
+    for depth in range(1, max_depth + 1):
+        # Aspiration window, the score rarely moves far between iterations so a narrow window around the last one
+        # cuts more of the tree. If the score lands outside it the failed side is widened and the depth searched again
+        alpha, beta, window = -inf, inf, ASPIRATION_WINDOW
+        if state.aspiration and depth >= ASPIRATION_MIN_DEPTH and best_score is not None and not is_mate_score(best_score):
+            alpha, beta = best_score - window, best_score + window
+
+        try:
+            while True:
+                move, score = minimax(board, depth, alpha, beta, True, maximizing_color, state)
+                if score <= alpha:
+                    window *= 2
+                    alpha = score - window if window <= ASPIRATION_MAX_WINDOW else -inf
+                elif score >= beta:
+                    window *= 2
+                    beta = score + window if window <= ASPIRATION_MAX_WINDOW else inf
+                else:
+                    break
+                state.aspiration_re_searches += 1
+        except SearchTimeout:
+            # Undo the moves that were still made when the search was stopped
+            while len(board.past_moves) > state.root_ply:
+                if board.past_moves[-1].null:
+                    board.unmake_null_move()
+                else:
+                    board.unmake_move()
+            break
+
+        best_move, best_score, completed_depth = move, score, depth
+        state.can_stop = True
+
+        # The line from the root, anything cut short by a table hit along the way is filled in from the table
+        best_line = state.pv_table[0] if state.pv_table[0] and state.pv_table[0][0] == best_move else [best_move] if best_move else []
+        if tt is not None and best_move is not None:
+            best_line = get_pv_line(board, tt, depth, best_line)
+        state.pv_line = best_line
+        if on_iteration is not None:
+            on_iteration(SearchInfo(depth, score, best_line, state.nodes, time.perf_counter() - start))
+
+        if best_move is None or is_mate_score(best_score) or in_tables:
+            break
+        if stop is not None and stop():
+            break
+
+        # The next iteration takes a few times longer than this one did, so don't start it if it can't finish
+        if deadline is not None and time.perf_counter() - start > time_limit * 0.5:
+            break
+
+    return SearchResult(best_move, best_score, completed_depth, state.nodes, time.perf_counter() - start,
+                        state.orderer.first_move_cutoff_rate(), state.null_move_cutoffs, state.reductions,
+                        state.re_searches, best_line, state.pvs_re_searches, state.aspiration_re_searches)
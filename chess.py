@@ -1,11 +1,47 @@
-from math import inf
-import pygame, ai, threading, queue, sys, os
+import pygame, ai, os, time
 from chess_board import Board
+from chess_position import Position
+from engine_worker import EngineWorker
+from opening_book import OpeningBook
+from chess_move import move_name, move_to_coords, move_promotion
 from globals import init_pieces_icons, TILES_IN_ROW
 
 pygame.init()
 
 class Chess:
+    TT_SIZE_MB = 64  # Memory budget of the ais transposition table
+
+    # The ais thinking budget per move, it searches deeper until one of these runs out
+    AI_TIME_LIMIT = 3.0     # Seconds
+    AI_NODE_LIMIT = None
+    AI_MAX_DEPTH = 64
+
+    # Selective search, either can be turned off to compare the search with and without it
+    AI_NULL_MOVE = True
+    AI_LMR = True
+    AI_PVS = True
+    AI_ASPIRATION = True
+
+    # Worker processes the search is split across, with 1 the engine process searches by itself. Only a search in the
+    # engine process reports each iteration as it finishes and stops straight away, so more workers trade the progress
+    # lines, the expected line and quick stops for speed
+    AI_WORKERS = 1
+
+    STOP_KEY = pygame.K_SPACE   # Makes the ai play the best move it has found so far
+
+    # Keep searching on the players turn, from the position after the reply the ai expects
+    AI_PONDER = True
+
+    # Book the ai plays from before searching, built with opening_book.py. The game runs without one if the file isn't there
+    OPENING_BOOK = "./book.bin"
+
+    # Set AI_CLOCK to the seconds on the ais clock to play a timed game, the time per move is then taken from the clock
+    AI_CLOCK = None
+    AI_INCREMENT = 0
+
+    FPS = 60
+    IDLE_WAIT_MS = 250  # Longest the game sleeps waiting for input when nothing on the screen is changing
+
     def __init__(self):
         SCREEN_WIDTH = 700
         SCREEN_HEIGHT = SCREEN_WIDTH
@@ -13,64 +49,156 @@ class Chess:
         pygame.display.set_caption("Chess Board")
         self.clock = pygame.time.Clock()
 
-        # Init thread stuff
-        self.ai_move = queue.Queue()
-        self.ai_move_arr = []
-        self.lock = threading.Lock()
-
         # Creates the board
         self.board = Board(self.screen, SCREEN_WIDTH, SCREEN_HEIGHT, 0, 0)  
         init_pieces_icons('./pieces') 
         self.board.init_locations_dict("./starting_locations.json")
         self.board.init_tiles()  
 
-        self.determining_moves = False
-
-    def draw(self, layer, coords):
-        self.screen.blit(layer, coords)
-
-    def draw_mask(self):
-        self.draw(self.board.mask_layer, (0, 0))
-
+        # The ai searches in its own process, which keeps its transposition table for the whole game
+        self.engine = EngineWorker(self.AI_WORKERS, self.TT_SIZE_MB)
+        self.ai_search = None   # The engine_worker.SearchHandle of the search for the ais next move
+        self.ai_deadline = None # time.perf_counter() value the ai has to move by when it's enforced here instead of by the search
+        self.ai_turn_start = None
+        self.ai_clock = self.AI_CLOCK
+        self.ai_pv = []
+
+        # The search running on the players turn and the key of the position it's searching, if the player makes
+        # the expected move the position matches and the search carries on as the ais search
+        self.ponder_search = None
+        self.ponder_hash = None
+
+        self.book = OpeningBook(self.OPENING_BOOK) if os.path.exists(self.OPENING_BOOK) else None
+
+    # Fn: get_time_limit()
+    # Brief: The seconds the ai can spend on its move, from its clock in a timed game
+    def get_time_limit(self):
+        if self.ai_clock is not None:
+            return ai.allocate_time(self.ai_clock, self.AI_INCREMENT)
+        return self.AI_TIME_LIMIT
+
+    # Fn: search_settings()
+    # Brief: The selective search switches passed to every search
+    def search_settings(self):
+        return {"null_move": self.AI_NULL_MOVE, "lmr": self.AI_LMR, "pvs": self.AI_PVS, "aspiration": self.AI_ASPIRATION}
+
+    # Fn: determine_move()
+    # Brief: Sends the position to the engine to find the ais move, the search runs while the game keeps drawing.
+    # If the ai was pondering on the move the player made, that search becomes the ais search instead of starting over.
+    # A move from the opening book is played straight away without searching
+    # Return: The engine_worker.SearchHandle of the search, None if a book move was played
     def determine_move(self):
-        # Adds the minimax check onto the queue of the thread
         f = open("board-output.txt", "w")
         f.write("")
         f.close()
-        self.determining_moves = True
-        #self.ai_move.put(ai.minimax(self.board.copy(), 3, inf, -inf, True, "b")[0])
-        self.ai_move_arr.append(ai.minimax(self.board.copy(), 3, -inf, inf, True, "b")[0])
-        sys.exit()  # Exit thread after a move is found
+        self.ai_turn_start = time.perf_counter()
+        time_limit = self.get_time_limit()
+
+        ponder_search = self.ponder_search
+        self.ponder_search = None
+
+        book_move = self.book.pick_move(self.board.position) if self.book is not None else None
+        if book_move is not None:
+            if ponder_search is not None:
+                ponder_search.cancel()
+            print(f"Book move: {move_name(book_move)}")
+            self.ai_pv = []
+            self.charge_clock()
+            self.board.make_move(move_to_coords(book_move), move_promotion(book_move))
+            return None
+
+        if ponder_search is not None:
+            if self.board.position.hash == self.ponder_hash:
+                # Ponder hit, the search has no budget of its own so it's stopped from here once the time is up
+                print("Ponder hit")
+                self.ai_deadline = self.ai_turn_start + time_limit if time_limit is not None else None
+                return ponder_search
+            ponder_search.cancel()
+
+        self.ai_deadline = None
+        return self.engine.search(self.board.snapshot(), "b", time_limit, self.AI_NODE_LIMIT, self.AI_MAX_DEPTH,
+                                  **self.search_settings())
+
+    # Fn: start_pondering()
+    # Brief: Starts searching the position after the players expected reply, the second move of the ais line
+    def start_pondering(self):
+        if not self.AI_PONDER or self.board.game_over or len(self.ai_pv) < 2:
+            return
+
+        position = Position.from_compact(self.board.snapshot())
+        if not position.make_move(self.ai_pv[1]):
+            return
+        self.ponder_hash = position.hash
+        self.ponder_search = self.engine.search(position.to_compact(), "b", None, None, self.AI_MAX_DEPTH, **self.search_settings())
+        print(f"Pondering on {move_name(self.ai_pv[1])}")
+
+    # Fn: show_progress()
+    # Brief: Prints the iterations a search has finished since the last frame
+    # Params: - search: The engine_worker.SearchHandle
+    #         - label: Put in front of each line, to tell the pondering apart
+    def show_progress(self, search, label="Depth"):
+        for info in search.get_updates():
+            if search is self.ai_search:
+                self.ai_pv = info.pv
+            print(f"{label} {info.depth}: score {info.score}, {info.nodes} nodes in {info.time:.2f}s, "
+                  f"line: {' '.join(move_name(move) for move in info.pv)}")
+
+    # Fn: charge_clock()
+    # Brief: Takes the time of the ais turn off its clock and adds the increment, for book and searched moves alike
+    def charge_clock(self):
+        if self.ai_clock is not None:
+            # A search that started as pondering ran for longer than the ais turn, only the turn comes off the clock
+            self.ai_clock += self.AI_INCREMENT - (time.perf_counter() - self.ai_turn_start)
+
+    # Fn: finish_move()
+    # Brief: Plays the move of a finished search
+    # Params: - result: The ai.SearchResult of the search
+    #         - tt_stats: The counters of the engine's transposition table, None if there aren't any
+    def finish_move(self, result, tt_stats=None):
+        if result is None or result.best_move is None:
+            return
+        self.ai_pv = result.pv  # The line the ai expects to be played from here
+
+        self.charge_clock()
+        print(f"Expected line: {' '.join(move_name(move) for move in result.pv)} (score {result.score})")
+        print(f"Searched {result.nodes} nodes to depth {result.depth} in {result.time:.2f}s, "
+              f"first move cutoffs: {result.first_move_cutoff_rate:.0%}, null move cutoffs: {result.null_move_cutoffs}, "
+              f"reductions: {result.reductions} ({result.re_searches} re-searched)")
+        if tt_stats is not None:
+            print(f"Transposition table: {tt_stats}")
+
+        move = result.best_move
+        if self.board.make_move(move_to_coords(move), move_promotion(move)):
+            self.start_pondering()
 
     def main_game(self):
-        t = threading.Thread(target=self.determine_move)
         run = True
         mouse_pos = None
+        idle = False
 
         while run and not self.board.game_over:
-            self.screen.fill((255, 255, 255))  # Refreshes screen
-            self.board.mask_layer.fill((0, 0, 0, 0))
-
             # Gets all possible moves 
             if self.board.active_player == "w" and not self.board.possible_moves_dict:
                 # print("Gathering possible moves for player")
                 moves = self.board.get_possible_moves(self.board.active_player)
                 self.board.possible_moves_dict = moves
 
-            # Draws all the tiles and pieces on the board
-            self.board.draw_board()
+            events = pygame.event.get()
+            if idle and not events:
+                # Nothing was drawn last frame and the ai isn't about to move, so sleep until there's input
+                event = pygame.event.wait(self.IDLE_WAIT_MS)
+                events = [event] if event.type != pygame.NOEVENT else []
 
-            mouse_pos = pygame.mouse.get_pos()
-            self.board.set_mouse_rel(mouse_pos)  # Sets the relative mouse position to the coords on the board
-
-            self.board.check_mouse_hover()
-
-            self.board.drag_piece(mouse_pos) # Move the selected piece with the mouse, while drawing possible moves
-
-            for event in pygame.event.get():
+            for event in events:
                 if event.type == pygame.QUIT:
                     run = False
 
+                if event.type == pygame.WINDOWEXPOSED:
+                    self.board.mark_all_dirty()  # Whatever covered the window took the board with it
+
+                if event.type == pygame.KEYDOWN and event.key == self.STOP_KEY and self.ai_search is not None:
+                    self.ai_search.stop()
+
                 if event.type == pygame.MOUSEBUTTONDOWN:
                     if event.button == 1:
                        self.board.select_piece()
@@ -80,40 +208,47 @@ class Chess:
                     self.board.place_piece()
                 
             # Tell ai to determine their move
-            #self.lock.acquire()
-            with self.lock:
-                if (self.board.active_player == "b" 
-                    #and self.ai_move.qsize() == 0 
-                    and len(self.ai_move_arr) == 0
-                    and not self.board.game_over
-                    and not t.is_alive()
-                    and not self.determining_moves):
-
-                    # Remake thread
-                    t = threading.Thread(target=self.determine_move)
-                    t.start()
-            #self.lock.release()
-
-            # Make move if it's their turn and they've found a move
-            if (self.board.active_player == "b"
-                #and self.ai_move.qsize() > 0
-                and len(self.ai_move_arr) > 0
-                and not self.board.game_over):
-                #move = self.ai_move.get()
-                move = self.ai_move_arr.pop()
-
-                if move != None and move[0] != None and move[1] != None:
-                    if self.board.make_move((move[0], move[1])):
-                        self.board.next_turn()
-                        self.determining_moves = False
-
-            self.draw_mask()
-
-            pygame.display.update()
-            self.clock.tick(60)
+            if self.board.active_player == "b" and not self.board.game_over and self.ai_search is None:
+                self.ai_search = self.determine_move()
+
+            if self.ponder_search is not None:
+                self.show_progress(self.ponder_search, "Pondering depth")
+
+            # Make move once the search has finished
+            if self.ai_search is not None:
+                self.show_progress(self.ai_search)
+                if self.ai_deadline is not None and time.perf_counter() >= self.ai_deadline:
+                    self.ai_search.stop()
+                    self.ai_deadline = None
+                if self.ai_search.done():
+                    search = self.ai_search
+                    result = None if search.future.cancelled() else search.result()
+                    self.ai_search = None
+                    self.finish_move(result, search.tt_stats)
+
+            mouse_pos = pygame.mouse.get_pos()
+            self.board.set_mouse_rel(mouse_pos)  # Sets the relative mouse position to the coords on the board
+
+            self.board.check_mouse_hover()
 
+            self.board.drag_piece(mouse_pos) # Move the selected piece with the mouse
+
+            # Only the parts of the board that changed are drawn and sent to the display
+            rects = self.board.draw_board()
+            if rects:
+                pygame.display.update(rects)
+            idle = not rects and self.ai_search is None
+            self.clock.tick(self.FPS)
+
+        for search in (self.ai_search, self.ponder_search):
+            if search is not None:
+                search.cancel()
+        self.engine.shutdown()
+        if self.book is not None:
+            self.book.close()
         pygame.quit()
 
-# Starts game 
-chess = Chess()
-chess.main_game()
\ No newline at end of file
+# Starts game, guarded so the worker processes of the parallel search can import this without opening a window
+if __name__ == "__main__":
+    chess = Chess()
+    chess.main_game()
\ No newline at end of file
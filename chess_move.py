@@ -0,0 +1,131 @@
+from globals import TILES_IN_ROW
+from chess_piece import EMPTY, PAWN, QUEEN, KING, TYPE_MASK, piece_char
+
+# Moves used by the engine are packed into one int so they're cheap to sort, hash and store in the transposition table
+#   bits 0-5:   the index of the square being moved from
+#   bits 6-11:  the index of the square being moved to
+#   bits 12-14: the type of piece a pawn promotes to, EMPTY if the move isn't a promotion
+#   bit 15:     set if the move captures a piece, en passant included
+#   bit 16:     set if the move is an en passant capture, the captured pawn isn't on the to square
+#   bit 17:     set if the move is a castle, the from and to squares are the kings
+# The gui still works with ((x, y), (x, y)) tuples and the possible_moves_dict, the helpers below convert between them
+TO_SHIFT = 6
+PROMOTION_SHIFT = 12
+SQUARE_MASK = 63
+PROMOTION_MASK = 7 << PROMOTION_SHIFT
+CAPTURE_FLAG = 1 << 15
+EN_PASSANT_FLAG = 1 << 16
+CASTLE_FLAG = 1 << 17
+MOVE_BITS = 18  # Every move fits below this bit, so a score can be packed above it
+MOVE_MASK = (1 << MOVE_BITS) - 1
+
+NULL_MOVE = 0   # a8 to a8 can never be a real move
+MAX_MOVES = 256 # No position has more legal moves than this
+
+# Fn: encode_move()
+# Brief: Packs a move into an int
+# Params: - from_index: The index of the square being moved from
+#         - to_index: The index of the square being moved to
+#         - promotion: The type of piece being promoted to, EMPTY if there isn't one
+#         - capture: If the move captures a piece
+# Return: The packed move
+def encode_move(from_index, to_index, promotion=EMPTY, capture=False):
+    move = from_index | (to_index << TO_SHIFT) | (promotion << PROMOTION_SHIFT)
+    return move | CAPTURE_FLAG if capture else move
+
+# Fn: move_promotion()
+# Brief: The type of piece a packed move promotes to, EMPTY if it isn't a promotion
+def move_promotion(move):
+    return (move >> PROMOTION_SHIFT) & 7
+
+# Fn: is_tactical()
+# Brief: Checks if a packed move is a capture or a promotion
+def is_tactical(move):
+    return move & (CAPTURE_FLAG | PROMOTION_MASK) != 0
+
+# Fn: index_to_coords()
+# Brief: Converts the index of a square into the (x, y) coordinates used by the gui
+def index_to_coords(index):
+    return (index % TILES_IN_ROW, index // TILES_IN_ROW)
+
+# Fn: move_to_coords()
+# Brief: Unpacks a move into the tuple of from and to coordinates used by the gui, the promotion is dropped
+def move_to_coords(move):
+    return (index_to_coords(move & SQUARE_MASK), index_to_coords((move >> TO_SHIFT) & SQUARE_MASK))
+
+# Fn: coords_to_move()
+# Brief: Packs a move from the gui, the flags and promotion are worked out from the squares of the position.
+# A king moving two files is a castle and a pawn moving diagonally onto an empty square is an en passant capture
+# Params: - squares: The squares of the position the move is being made in
+#         - move: Tuple containing the move from and move to coordinates
+#         - promotion: The type of piece a pawn reaching the last rank becomes, the gui always picks a queen
+# Return: The packed move
+def coords_to_move(squares, move, promotion=QUEEN):
+    (from_x, from_y), (to_x, to_y) = move
+    from_index = from_y * TILES_IN_ROW + from_x
+    to_index = to_y * TILES_IN_ROW + to_x
+    piece_type = squares[from_index] & TYPE_MASK
+    is_promotion = piece_type == PAWN and (to_y == 0 or to_y == TILES_IN_ROW - 1)
+    packed = encode_move(from_index, to_index, promotion if is_promotion else EMPTY, squares[to_index] != EMPTY)
+
+    if piece_type == KING and abs(to_x - from_x) == 2:
+        packed |= CASTLE_FLAG
+    elif piece_type == PAWN and from_x != to_x and squares[to_index] == EMPTY:
+        packed |= EN_PASSANT_FLAG | CAPTURE_FLAG
+    return packed
+
+# Fn: moves_to_dict()
+# Brief: Builds the gui's possible_moves_dict from packed moves, with the from coordinates as the key and
+# the list of to coordinates as the value. Promotions to different pieces share the one to square
+# Params: - moves: Iterable of packed moves
+# Return: The dictionary of possible moves
+def moves_to_dict(moves):
+    possible_moves = {}
+    for move in moves:
+        from_coords, to_coords = move_to_coords(move)
+        moves_to = possible_moves.setdefault(from_coords, [])
+        if to_coords not in moves_to:
+            moves_to.append(to_coords)
+    return possible_moves
+
+# Fn: square_name()
+# Brief: The algebraic name of a square index, index 0 is a8 since black starts at the top
+def square_name(index):
+    return "abcdefgh"[index % TILES_IN_ROW] + str(TILES_IN_ROW - index // TILES_IN_ROW)
+
+# Fn: square_index()
+# Brief: The index of a square from its algebraic name, the opposite of square_name
+def square_index(name):
+    return (TILES_IN_ROW - int(name[1])) * TILES_IN_ROW + "abcdefgh".index(name[0])
+
+# Fn: move_name()
+# Brief: A packed move in coordinate notation such as e2e4, or e7e8q for a promotion
+def move_name(move):
+    name = square_name(move & SQUARE_MASK) + square_name((move >> TO_SHIFT) & SQUARE_MASK)
+    promotion = move_promotion(move)
+    return name + piece_char(promotion) if promotion != EMPTY else name
+
+# A move list that's allocated once and reused, the search keeps one for every ply so generating the moves
+# of a node doesn't allocate. Only the first count entries are moves of the current position
+class MoveList:
+    __slots__ = ("moves", "count")
+
+    def __init__(self):
+        self.moves = [NULL_MOVE] * MAX_MOVES
+        self.count = 0
+
+    # Fn: to_list()
+    # Brief: Copies the moves of the current position out into a plain list
+    def to_list(self):
+        return self.moves[:self.count]
+
+    def __len__(self):
+        return self.count
+
+    def __iter__(self):
+        moves = self.moves
+        for i in range(self.count):
+            yield moves[i]
+
+    def __contains__(self, move):
+        return move in self.moves[:self.count]
@@ -2,7 +2,222 @@ import pygame
 from abc import ABC, abstractmethod
 from globals import imgs_dict, TILES_IN_ROW, piece_values
 
+# Piece codes used by the headless position (chess_position.Position), the low three bits hold
+# the type of piece and the BLACK bit holds its color, an empty square is just 0
+EMPTY = 0
+PAWN = 1
+KNIGHT = 2
+BISHOP = 3
+ROOK = 4
+QUEEN = 5
+KING = 6
+BLACK = 8
+TYPE_MASK = 7
+
+PIECE_CHARS = " pnbrqk"  # Indexed by the type of piece, matches the chars used in starting_locations.json
+
+# Fn: color_bit()
+# Brief: Converts the "w" or "b" used throughout the game into the color bit of a piece code
+def color_bit(color):
+    return BLACK if color == "b" else 0
+
+# Fn: encode_piece()
+# Brief: Builds the piece code for the headless position
+# Params: - color: "w" or "b"
+#         - piece_c: The char indicating the type of piece
+# Return: The piece code
+def encode_piece(color, piece_c):
+    return PIECE_CHARS.index(piece_c) | color_bit(color)
+
+# Fn: piece_color()
+# Brief: The inverse of color_bit, gets the "w" or "b" of a piece code
+def piece_color(code):
+    return "b" if code & BLACK else "w"
+
+# Fn: piece_char()
+# Brief: Gets the char indicating the type of piece from a piece code
+def piece_char(code):
+    return PIECE_CHARS[code & TYPE_MASK]
+
+# Fn: build_leaper_targets()
+# Brief: Builds the list of squares a piece that jumps by fixed offsets (knight or king) can reach from every square
+# Params: - offsets: The x and y offsets the piece can jump by
+# Return: A list indexed by square where each element is the list of target squares
+def build_leaper_targets(offsets):
+    targets = []
+    for index in range(TILES_IN_ROW * TILES_IN_ROW):
+        x, y = index % TILES_IN_ROW, index // TILES_IN_ROW
+        targets.append([(y + y_mod) * TILES_IN_ROW + x + x_mod for x_mod, y_mod in offsets
+                        if 0 <= x + x_mod < TILES_IN_ROW and 0 <= y + y_mod < TILES_IN_ROW])
+    return targets
+
+# Fn: build_rays()
+# Brief: Builds the squares a sliding piece passes through in each direction from every square, closest square first
+# Return: A list indexed by square, then by index in DIRECTIONS
+def build_rays():
+    rays = []
+    for index in range(TILES_IN_ROW * TILES_IN_ROW):
+        x, y = index % TILES_IN_ROW, index // TILES_IN_ROW
+        square_rays = []
+        for x_mod, y_mod in DIRECTIONS:
+            ray = []
+            new_x, new_y = x + x_mod, y + y_mod
+            while 0 <= new_x < TILES_IN_ROW and 0 <= new_y < TILES_IN_ROW:
+                ray.append(new_y * TILES_IN_ROW + new_x)
+                new_x += x_mod
+                new_y += y_mod
+            square_rays.append(ray)
+        rays.append(square_rays)
+    return rays
+
+# The first four directions are straight like a rook, the last four are diagonal like a bishop
+DIRECTIONS = [(-1, 0), (1, 0), (0, -1), (0, 1), (-1, -1), (1, -1), (-1, 1), (1, 1)]
+STRAIGHT_DIRECTIONS = range(0, 4)
+DIAGONAL_DIRECTIONS = range(4, 8)
+ALL_DIRECTIONS = range(0, 8)
+
+KNIGHT_TARGETS = build_leaper_targets([(1, 2), (2, 1), (2, -1), (1, -2), (-1, -2), (-2, -1), (-2, 1), (-1, 2)])
+KING_TARGETS = build_leaper_targets(DIRECTIONS)
+RAYS = build_rays()
+
+# The squares a pawn attacks from every square, indexed by the color bit of the pawn, white pawns move up the board
+PAWN_ATTACKS = {
+    0: build_leaper_targets([(-1, -1), (1, -1)]),
+    BLACK: build_leaper_targets([(-1, 1), (1, 1)])
+}
+
+# Fn: build_pawn_pushes()
+# Brief: Builds the squares a pawn can push to from every square, two from the rank it starts on
+# Params: - y_mod: The direction the pawn moves, -1 for white and 1 for black
+#         - start_row: The row the pawns of the color start on
+# Return: A list indexed by square where each element is the list of push squares, closest first
+def build_pawn_pushes(y_mod, start_row):
+    pushes = []
+    for index in range(TILES_IN_ROW * TILES_IN_ROW):
+        x, y = index % TILES_IN_ROW, index // TILES_IN_ROW
+        steps = 2 if y == start_row else 1
+        pushes.append([(y + y_mod * step) * TILES_IN_ROW + x for step in range(1, steps + 1)
+                       if 0 <= y + y_mod * step < TILES_IN_ROW])
+    return pushes
+
+PAWN_PUSHES = {
+    0: build_pawn_pushes(-1, TILES_IN_ROW - 2),
+    BLACK: build_pawn_pushes(1, 1)
+}
+
+# Fn: is_square_attacked()
+# Brief: Checks if any piece of a color attacks a square by looking outwards from the square with the
+# leaper and ray tables, rather than generating the moves of every enemy piece
+# Params: - squares: The squares of the position
+#         - index: The index of the square being attacked
+#         - side: The color bit of the attacking pieces
+# Return: Boolean if the square is attacked
+def is_square_attacked(squares, index, side):
+    # A pawn of the attacking color would sit where a pawn of the other color on this square attacks
+    pawn = PAWN | side
+    for target in PAWN_ATTACKS[side ^ BLACK][index]:
+        if squares[target] == pawn:
+            return True
+
+    knight = KNIGHT | side
+    for target in KNIGHT_TARGETS[index]:
+        if squares[target] == knight:
+            return True
+
+    king = KING | side
+    for target in KING_TARGETS[index]:
+        if squares[target] == king:
+            return True
+
+    queen = QUEEN | side
+    square_rays = RAYS[index]
+    for slider, directions in ((ROOK | side, STRAIGHT_DIRECTIONS), (BISHOP | side, DIAGONAL_DIRECTIONS)):
+        for direction in directions:
+            for target in square_rays[direction]:
+                piece = squares[target]
+                if piece != EMPTY:
+                    if piece == slider or piece == queen:
+                        return True
+                    break
+
+    return False
+
+# Fn: get_attackers()
+# Brief: The same lookup as is_square_attacked but it collects every attacking square, useful for finding what gives check
+# Return: List of the indexes of the attacking pieces
+def get_attackers(squares, index, side):
+    attackers = []
+    pawn = PAWN | side
+    attackers += [target for target in PAWN_ATTACKS[side ^ BLACK][index] if squares[target] == pawn]
+
+    knight = KNIGHT | side
+    attackers += [target for target in KNIGHT_TARGETS[index] if squares[target] == knight]
+
+    king = KING | side
+    attackers += [target for target in KING_TARGETS[index] if squares[target] == king]
+
+    queen = QUEEN | side
+    square_rays = RAYS[index]
+    for slider, directions in ((ROOK | side, STRAIGHT_DIRECTIONS), (BISHOP | side, DIAGONAL_DIRECTIONS)):
+        for direction in directions:
+            for target in square_rays[direction]:
+                piece = squares[target]
+                if piece != EMPTY:
+                    if piece == slider or piece == queen:
+                        attackers.append(target)
+                    break
+
+    return attackers
+
+# Fn: get_capture_targets()
+# Brief: Finds only the squares a piece can capture on, plus the promotion square for a pawn about to promote,
+# straight from the tables so the quiet moves never get generated. Used by the quiescence search
+# Params: - squares: The squares of the position
+#         - index: The index of the piece
+#         - side: The color bit of the piece
+# Return: List of target indexes
+def get_capture_targets(squares, index, side):
+    piece_t = squares[index] & TYPE_MASK
+    enemy = side ^ BLACK
+
+    if piece_t == PAWN:
+        targets = [target for target in PAWN_ATTACKS[side][index]
+                   if squares[target] != EMPTY and (squares[target] & BLACK) == enemy]
+        forward = index + TILES_IN_ROW if side == BLACK else index - TILES_IN_ROW
+        if (forward < TILES_IN_ROW or forward >= TILES_IN_ROW * (TILES_IN_ROW - 1)) and squares[forward] == EMPTY:
+            targets.append(forward)
+        return targets
+
+    if piece_t == KNIGHT or piece_t == KING:
+        leaps = KNIGHT_TARGETS[index] if piece_t == KNIGHT else KING_TARGETS[index]
+        return [target for target in leaps if squares[target] != EMPTY and (squares[target] & BLACK) == enemy]
+
+    if piece_t == ROOK:
+        directions = STRAIGHT_DIRECTIONS
+    elif piece_t == BISHOP:
+        directions = DIAGONAL_DIRECTIONS
+    else:
+        directions = range(0, 8)
+
+    targets = []
+    square_rays = RAYS[index]
+    for direction in directions:
+        for target in square_rays[direction]:
+            piece = squares[target]
+            if piece != EMPTY:
+                if (piece & BLACK) == enemy:
+                    targets.append(target)
+                break
+    return targets
+
+# The images of the pieces by piece_c, color and size. Each png is only read and scaled the first time it's
+# needed, after that every piece of the same kind shares the one surface
+piece_imgs = {}
+
 class Piece:
+    # The pieces are made and copied with the board, slots keep each one to a fixed set of fields without a dict
+    __slots__ = ("color", "piece_c", "img", "x", "y", "width", "height", "being_dragged")
+
     def __init__(self, x, y, width, height, color, piece):
         self.color = color
         self.piece_c = piece
@@ -17,35 +232,26 @@ class Piece:
         self.height = height
 
         self.being_dragged = False
-        
+
     # Fn: set_image()
     # Brief: Sets the image that gets displayed for the current piece when the board is drawn
     def set_image(self):
-        img_path = Piece.get_img_path(self.piece_c, self.color)
-        if img_path:
-            self.img = pygame.image.load(img_path)
-            self.img = pygame.transform.scale(self.img, (self.width, self.height))
-    
+        self.img = Piece.get_img(self.piece_c, self.color, (self.width, self.height))
+
     # Fn: set_coords()
-    # Brief: Sets the coordinates for the current piece 
+    # Brief: Sets the coordinates for the current piece
     # Params: - coords: The new coordinates of the piece
     def set_coords(self, coords):
         self.x, self.y = coords
 
     # Fn: piece_is_enemy()
     # Brief: Useful for finding potential piece movements
-    # Params: - tile: A tile object
-    # Return: Boolean if the provided tile is an enemy
+    # Params: - code: The piece code on a square of the position
+    #         - side: The color bit of the moving piece
+    # Return: Boolean if the provided square holds an enemy
     @staticmethod
-    def piece_is_enemy(tile, color):
-        return tile.piece and tile.piece.color != color
-    
-    # Fn: tile_available()
-    # Brief: Useful for finding potential piece movements
-    # Params: - tile: A tile object
-    # Return: Boolean if the provided tile is empty or an enemy piece
-    def tile_available(self, tile):
-        return tile.piece is None or Piece.piece_is_enemy(tile, self.color)
+    def piece_is_enemy(code, side):
+        return code != EMPTY and (code & BLACK) != side
 
     # Fn: make_piece()
     # Brief: Returns the correct child object that matches the piece_c,
@@ -70,13 +276,30 @@ class Piece:
     def get_img_path(piece_c, color):
         return imgs_dict[f"{piece_c}{color}.png"]
 
+    # Fn: get_img()
+    # Brief: Gets the shared image of a piece, loading it the first time it's asked for
+    # Params: - piece_c: The char indicating the type of piece
+    #         - color: The color of the piece
+    #         - size: Tuple of the width and height to scale the image to
+    # Return: The pygame surface of the image
+    @staticmethod
+    def get_img(piece_c, color, size):
+        img = piece_imgs.get((piece_c, color, size))
+        if img is None:
+            img = pygame.transform.scale(pygame.image.load(Piece.get_img_path(piece_c, color)), size)
+            # Matching the pixel format of the display makes drawing it cheaper, which needs the display to be set up
+            if pygame.display.get_surface() is not None:
+                img = img.convert_alpha()
+            piece_imgs[(piece_c, color, size)] = img
+        return img
+
 
     # Fn: move()
     # Brief: Transfers the current piece from one tile to another
     # Params: - og_tile: The move_from tile
     #         - tile: The move_to tile
     @staticmethod
-    def move(og_tile, tile): 
+    def move(og_tile, tile):
         if og_tile == tile: return
 
         tile.piece = og_tile.piece
@@ -84,58 +307,25 @@ class Piece:
         tile.piece.set_coords((tile.tile_x, tile.tile_y))
         og_tile.piece = None    # Reset the tile you moved from
 
-    # Gets the moves that a piece can make in any direction
-    def get_omni_moves(self, x_mod, y_mod, moves, tiles):
-        x = self.x
-        y = self.y
-        num_moves = 0
-        while True:
-            can_move_x = 0 <= (x + x_mod) < TILES_IN_ROW
-            can_move_y = 0 <= (y + y_mod) < TILES_IN_ROW
-
-            # Allows alternate behavior based off the type of piece this is
-
-            # Since pawns are the only piece that can't move backwards, just check to see which
-            # color it is, then determine if the pawn is at it's start based off that
-            pawn_at_start = self.piece_c == "p" and (
-                (self.color == "w" and self.y == 6) or (self.color == "b" and self.y == 1))
-
-            if self.piece_c == "k" and num_moves == 1:
-                return
-            elif self.piece_c == "p" and pawn_at_start and num_moves == 2:
-                return 
-            elif self.piece_c == "p" and not pawn_at_start and num_moves == 1:
-                return 
-
-            x += x_mod
-            y += y_mod
-
-            # If the piece is a pawn, it can't move forward if there's an enemy in the way
-            if (can_move_x and can_move_y) and self.tile_available(tiles[y][x]):
-                if self.piece_c == "p" and tiles[y][x].piece:
-                    return
-                
-                moves.append((x, y))
-                num_moves += 1
-
-                # The enemy is the farthest a piece can move to, so it breaks from the loop when one is reached
-                if Piece.piece_is_enemy(tiles[y][x], self.color):
-                    return
-            else:
-                return
-            
-    def get_all_dirs(self, moves, tiles):
-        # 1. Get moves moving like rook
-        self.get_omni_moves(-1, 0, moves, tiles)    # Left
-        self.get_omni_moves(1, 0, moves, tiles)     # Right
-        self.get_omni_moves(0, -1, moves, tiles)    # Up
-        self.get_omni_moves(0, 1, moves, tiles)     # Down
-
-        # 2. Get moves moving like bishop
-        self.get_omni_moves(-1, -1, moves, tiles)   # Up left
-        self.get_omni_moves(1, -1, moves, tiles)    # Up right
-        self.get_omni_moves(-1, 1, moves, tiles)    # Down left
-        self.get_omni_moves(1, 1, moves, tiles)     # Down right
+    # Gets the moves of a sliding piece from the precomputed rays, the move generators work on the
+    # squares of the headless position so no tiles or pieces are needed. The enemy is the farthest
+    # a piece can move to, so each ray stops at the first piece either way
+    @staticmethod
+    def get_ray_moves(squares, index, side, directions, moves):
+        rays = RAYS[index]
+        for direction in directions:
+            for target in rays[direction]:
+                code = squares[target]
+                if code != EMPTY:
+                    if (code & BLACK) != side:
+                        moves.append(target)
+                    break
+                moves.append(target)
+
+    # Gets the moves of a piece that jumps to a fixed set of squares, from the precomputed targets of its square
+    @staticmethod
+    def get_leaper_moves(squares, side, targets):
+        return [target for target in targets if squares[target] == EMPTY or (squares[target] & BLACK) != side]
 
     # x, y, width, height, color, piece
     def copy(self):
@@ -145,102 +335,83 @@ class Piece:
         return copy
 
 class King(Piece):
+    __slots__ = ()
+
     def __init__(self, color, x, y, width, height):
         super(King, self).__init__(x, y, width, height, color, "k")
 
-    # get_all_dirs works differently if the piece is a king,
-    # so implementation of get_moves is the same as the queens
-    def get_moves(self, board):
-        moves = []
-        self.get_all_dirs(moves, board.tiles)
+    # The king steps one square in any direction
+    @staticmethod
+    def get_moves(squares, index, side):
+        moves = Piece.get_leaper_moves(squares, side, KING_TARGETS[index])
         return moves if len(moves) > 0 else None
 
 class Queen(Piece):
+    __slots__ = ()
+
     def __init__(self, color, x, y, width, height):
         super(Queen, self).__init__(x, y, width, height, color, "q")
 
-    def get_moves(self, board):
+    @staticmethod
+    def get_moves(squares, index, side):
         moves = []
-        self.get_all_dirs(moves, board.tiles)
+        Piece.get_ray_moves(squares, index, side, ALL_DIRECTIONS, moves)
         return moves if len(moves) > 0 else None
-        
+
 class Bishop(Piece):
+    __slots__ = ()
+
     def __init__(self, color, x, y, width, height):
         super(Bishop, self).__init__(x, y, width, height, color, "b")
 
-    def get_moves(self, board):
+    @staticmethod
+    def get_moves(squares, index, side):
         moves = []
-        tiles = board.tiles
-
-        # Get moves from moving diagonally
-        self.get_omni_moves(-1, -1, moves, tiles)   # Up left
-        self.get_omni_moves(1, -1, moves, tiles)    # Up right
-        self.get_omni_moves(-1, 1, moves, tiles)    # Down left
-        self.get_omni_moves(1, 1, moves, tiles)     # Down right
+        Piece.get_ray_moves(squares, index, side, DIAGONAL_DIRECTIONS, moves)
         return moves if len(moves) > 0 else None
 
 class Knight(Piece):
+    __slots__ = ()
+
     def __init__(self, color, x, y, width, height):
         super(Knight, self).__init__(x, y, width, height, color, "n")
 
     # Gets moves in an l shaped pattern
-    def get_moves(self, board):
-        moves = []
-
-        def get_l_move(x_mod, y_mod):
-            new_x = self.x + x_mod
-            new_y = self.y + y_mod
-            if (0 <= new_x < TILES_IN_ROW) and (0 <= new_y < TILES_IN_ROW):
-                if self.tile_available(board.tiles[new_y][new_x]):
-                    moves.append((new_x, new_y))
-
-        get_l_move(1, 2)    # Up right
-        get_l_move(2, 1)    # Right up
-        get_l_move(2, -1)   # Right down
-        get_l_move(1, -2)   # Down right
-        get_l_move(-1, -2)  # Down left
-        get_l_move(-2, -1)  # Left down
-        get_l_move(-2, 1)   # Left up
-        get_l_move(-1, 2)   # Up left
-        
+    @staticmethod
+    def get_moves(squares, index, side):
+        moves = Piece.get_leaper_moves(squares, side, KNIGHT_TARGETS[index])
         return moves if len(moves) > 0 else None
 
 class Rook(Piece):
+    __slots__ = ()
+
     def __init__(self, color, x, y, width, height):
         super(Rook, self).__init__(x, y, width, height, color, "r")
 
-    def get_moves(self, board):
+    @staticmethod
+    def get_moves(squares, index, side):
         moves = []
-        tiles = board.tiles
-
-        # Get the moves from moving in straight lines
-        self.get_omni_moves(-1, 0, moves, tiles)    # Left
-        self.get_omni_moves(1, 0, moves, tiles)     # Right
-        self.get_omni_moves(0, -1, moves, tiles)    # Up
-        self.get_omni_moves(0, 1, moves, tiles)     # Down
+        Piece.get_ray_moves(squares, index, side, STRAIGHT_DIRECTIONS, moves)
         return moves if len(moves) > 0 else None
 
 class Pawn(Piece):
+    __slots__ = ()
+
     def __init__(self, color, x, y, width, height):
         super(Pawn, self).__init__(x, y, width, height, color, "p")
 
-    def get_moves(self, board):
-        # Checks only a few surrounding tiles for moves since the pawns moveset is very limited
+    @staticmethod
+    def get_moves(squares, index, side):
+        # Pushes stop at the first piece in the way since pawns can't take moving forward
         moves = []
-        tiles = board.tiles
+        for target in PAWN_PUSHES[side][index]:
+            if squares[target] != EMPTY:
+                break
+            moves.append(target)
 
-        y_mod = 1 if self.color == "b" else -1
-
-        # 1. Get how many moves you can make forward
-        self.get_omni_moves(0, y_mod, moves, tiles)          
-
-        # 2. Check both diagonals
-        upper_diag_in_bound = lambda x : (0 <= x < TILES_IN_ROW) and (0 <= (self.y + y_mod) < TILES_IN_ROW)
-        
-        if upper_diag_in_bound(self.x - 1) and Piece.piece_is_enemy(board.tiles[self.y + y_mod][self.x - 1], self.color):
-            moves.append((self.x - 1, self.y + y_mod))
-
-        if upper_diag_in_bound(self.x + 1) and Piece.piece_is_enemy(board.tiles[self.y + y_mod][self.x + 1], self.color):
-            moves.append((self.x + 1, self.y + y_mod))
+        # Captures on both diagonals
+        moves += [target for target in PAWN_ATTACKS[side][index] if Piece.piece_is_enemy(squares[target], side)]
+        return moves if len(moves) > 0 else None
 
-        return moves if len(moves) > 0 else None
\ No newline at end of file
+# The class holding the move generator for each type of piece, indexed by the type bits of a piece code
+PIECE_CLASSES = [None, Pawn, Knight, Bishop, Rook, Queen, King]
@@ -0,0 +1,789 @@
+import random, re
+from collections import namedtuple
+from globals import TILES_IN_ROW
+from chess_piece import EMPTY, PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING, BLACK, TYPE_MASK, PIECE_CLASSES, RAYS, STRAIGHT_DIRECTIONS
+from chess_piece import PAWN_ATTACKS
+from evaluation import MG_TABLES, EG_TABLES, PHASES, FILE_COUNTS
+from chess_piece import color_bit, encode_piece, piece_char, is_square_attacked, get_attackers, get_capture_targets
+from chess_move import TO_SHIFT, PROMOTION_SHIFT, SQUARE_MASK, CAPTURE_FLAG, EN_PASSANT_FLAG, CASTLE_FLAG, MoveList
+from chess_move import move_promotion, index_to_coords, moves_to_dict, square_name, square_index
+
+# Castling rights, one bit for each side a player can still castle to
+WHITE_KINGSIDE = 1
+WHITE_QUEENSIDE = 2
+BLACK_KINGSIDE = 4
+BLACK_QUEENSIDE = 8
+CASTLING_CHARS = ((WHITE_KINGSIDE, "K"), (WHITE_QUEENSIDE, "Q"), (BLACK_KINGSIDE, "k"), (BLACK_QUEENSIDE, "q"))
+
+# The king and rook squares of each castle as (right, king from, king to, rook from, rook to, squares that have to be empty)
+# Row 0 is black's back rank, so a8 is index 0 and h1 is index 63
+CASTLES = {
+    "w": ((WHITE_KINGSIDE, 60, 62, 63, 61, (61, 62)), (WHITE_QUEENSIDE, 60, 58, 56, 59, (57, 58, 59))),
+    "b": ((BLACK_KINGSIDE, 4, 6, 7, 5, (5, 6)), (BLACK_QUEENSIDE, 4, 2, 0, 3, (1, 2, 3)))
+}
+
+# The rights that are kept when a piece moves from or to a square, moving a king or rook or capturing a rook
+# on its starting square loses the rights that depend on it
+CASTLING_MASKS = [WHITE_KINGSIDE | WHITE_QUEENSIDE | BLACK_KINGSIDE | BLACK_QUEENSIDE] * (TILES_IN_ROW * TILES_IN_ROW)
+for right, king_from, _, rook_from, _, _ in CASTLES["w"] + CASTLES["b"]:
+    CASTLING_MASKS[king_from] &= ~right
+    CASTLING_MASKS[rook_from] &= ~right
+
+NO_EN_PASSANT = -1
+
+# Fn: castle_rook_squares()
+# Brief: Finds where the rook moves from and to when the king castles
+# Params: - king_from, king_to: The indexes of the squares the king moves from and to
+# Return: Tuple of the rook's from and to indexes
+def castle_rook_squares(king_from, king_to):
+    if king_to > king_from:
+        return king_to + 1, king_to - 1
+    return king_to - 2, king_to + 1
+
+# Zobrist keys, one random 64 bit number for every piece code on every square plus one for black to move, one for every
+# set of castling rights and one for every file an en passant capture can be made on.
+# The seed is fixed so that the same position always hashes to the same key between runs
+zobrist_random = random.Random(20240101)
+ZOBRIST_PIECES = [[zobrist_random.getrandbits(64) for _ in range(TILES_IN_ROW * TILES_IN_ROW)] for _ in range((BLACK | KING) + 1)]
+ZOBRIST_BLACK_TO_MOVE = zobrist_random.getrandbits(64)
+ZOBRIST_CASTLING = [0] + [zobrist_random.getrandbits(64) for _ in range(15)]    # No rights hashes to nothing
+ZOBRIST_EN_PASSANT = [zobrist_random.getrandbits(64) for _ in range(TILES_IN_ROW)]
+# The keys of only the pawns, every other piece code has all zeros, for the pawn hash the pawn structure is cached by
+ZOBRIST_PAWNS = [keys if code & TYPE_MASK == PAWN else [0] * (TILES_IN_ROW * TILES_IN_ROW) for code, keys in enumerate(ZOBRIST_PIECES)]
+
+PROMOTION_PIECES = (QUEEN, ROOK, BISHOP, KNIGHT)   # Every piece a pawn can promote to, best first
+
+FEN_PIECES = "pnbrqkPNBRQK"
+START_FEN = "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1"
+
+# One entry of the undo stack, what make_move changed and the state from before it so unmake_move can put
+# everything back in place. A record is never changed once it's pushed, so it's a tuple that copies and snapshots
+# of the position can share instead of each needing their own
+#   piece:     Piece code that moved, before any promotion
+#   captured:  Piece code that was captured, the pawn for en passant even though it's not on the to square
+#   promotion: The type of piece a pawn promoted to, EMPTY if it didn't
+#   null:      Pushed by make_null_move, nothing moved
+UndoRecord = namedtuple("UndoRecord", ["piece", "captured", "from_index", "to_index", "promotion", "mg_score",
+                                       "eg_score", "phase", "files", "pawn_hash", "game_over", "whiteKingCoords",
+                                       "blackKingCoords", "hash", "castling", "en_passant", "halfmove_clock",
+                                       "fullmove_number", "null"],
+                        defaults=(False,))
+
+# An immutable copy of a position from Position.to_compact. It only holds bytes, tuples and numbers, so it's cheap
+# to make, safe to hold on to while the position keeps changing, and can be pickled to send to other processes
+CompactPosition = namedtuple("CompactPosition", ["squares", "active_player", "mg_score", "eg_score", "phase", "files",
+                                                 "pawn_hash", "game_over", "whiteKingCoords", "blackKingCoords",
+                                                 "castling", "en_passant", "halfmove_clock", "fullmove_number", "hash",
+                                                 "past_moves"])
+
+# The headless game state that the search runs on. The board is a mailbox of 64 piece codes
+# (see chess_piece) indexed by y * TILES_IN_ROW + x, so no tiles, pieces or other pygame objects are involved
+class Position:
+    def __init__(self):
+        self.squares = [EMPTY] * (TILES_IN_ROW * TILES_IN_ROW)
+
+        self.past_moves = []    # Stack of UndoRecords, one for every move made, useful for minimax backtracking
+
+        self.active_player = "w"    # White always goes first in chess
+
+        # The terms of the evaluation that make_move keeps up to date, see the evaluation module
+        self.mg_score = 0
+        self.eg_score = 0
+        self.phase = 0
+        self.files = 0
+        self.pawn_hash = 0
+
+        self.game_over = None
+
+        # Save the location of the kings coords so that when needed to see if they're in check, don't have to iterate the squares to find each location
+        self.whiteKingCoords = None
+        self.blackKingCoords = None
+
+        self.castling = 0                   # Bits of the castling rights both players still have
+        self.en_passant = NO_EN_PASSANT     # Index of the square a pawn can capture en passant on
+        self.halfmove_clock = 0             # Moves since the last capture or pawn move, for the fifty move rule
+        self.fullmove_number = 1            # Goes up after every black move
+
+        self.hash = 0   # Zobrist key of the position, kept up to date by make_move and unmake_move
+
+    # Fn: compute_hash()
+    # Brief: Builds the zobrist key of the position from scratch, the key is updated incrementally after this
+    # Return: The zobrist key
+    def compute_hash(self):
+        key = ZOBRIST_BLACK_TO_MOVE if self.active_player == "b" else 0
+        for index, piece in enumerate(self.squares):
+            if piece != EMPTY:
+                key ^= ZOBRIST_PIECES[piece][index]
+        key ^= ZOBRIST_CASTLING[self.castling]
+        if self.en_passant != NO_EN_PASSANT:
+            key ^= ZOBRIST_EN_PASSANT[self.en_passant % TILES_IN_ROW]
+        return key
+
+    # Fn: compute_evaluation()
+    # Brief: Works out the terms of the evaluation from scratch, like the key they're updated incrementally after this
+    def compute_evaluation(self):
+        self.mg_score = self.eg_score = self.phase = self.files = self.pawn_hash = 0
+        for index, piece in enumerate(self.squares):
+            if piece != EMPTY:
+                self.mg_score += MG_TABLES[piece][index]
+                self.eg_score += EG_TABLES[piece][index]
+                self.phase += PHASES[piece]
+                self.files += FILE_COUNTS[piece][index]
+                self.pawn_hash ^= ZOBRIST_PAWNS[piece][index]
+
+    # Fn: load_locations()
+    # Brief: Places the pieces from a dictionary in the same format as the starting_locations json file, a player can
+    # castle with every rook that's still on its starting square next to the king on its starting square
+    # Params: - locations_dict: Dictionary with "x, y" strings as keys and the color and piece char as the value
+    def load_locations(self, locations_dict):
+        self.squares = [EMPTY] * (TILES_IN_ROW * TILES_IN_ROW)
+        for coords, piece_val in locations_dict.items():
+            col, row = (int(axis) for axis in coords.split(","))
+            self.squares[row * TILES_IN_ROW + col] = encode_piece(piece_val[0], piece_val[1])
+
+            if piece_val[1] == "k":
+                if piece_val[0] == "b":
+                    self.blackKingCoords = (col, row)
+                else:
+                    self.whiteKingCoords = (col, row)
+
+        self.castling = 0
+        for color in ("w", "b"):
+            side = color_bit(color)
+            for right, king_from, _, rook_from, _, _ in CASTLES[color]:
+                if self.squares[king_from] == KING | side and self.squares[rook_from] == ROOK | side:
+                    self.castling |= right
+        self.en_passant = NO_EN_PASSANT
+        self.halfmove_clock = 0
+        self.fullmove_number = 1
+        self.hash = self.compute_hash()
+        self.compute_evaluation()
+
+    # Fn: load_fen()
+    # Brief: Sets up the position from a FEN string without touching any pygame objects. The castling, en passant and
+    # clock fields can be left off, as they are in EPD records, and default to none, none, 0 and 1
+    # Params: - fen: The FEN string, rank 8 comes first which is row 0 of the squares
+    # Return: None, raises ValueError naming the field that's wrong if the FEN is malformed
+    def load_fen(self, fen):
+        fields = fen.split()
+        if not 2 <= len(fields) <= 6:
+            raise ValueError(f"Invalid FEN, expected 2 to 6 fields but got {len(fields)}: {fen}")
+        ranks = fields[0].split("/")
+        if len(ranks) != TILES_IN_ROW:
+            raise ValueError(f"Invalid FEN piece placement, expected {TILES_IN_ROW} ranks: {fen}")
+
+        squares = [EMPTY] * (TILES_IN_ROW * TILES_IN_ROW)
+        kings = {"w": [], "b": []}
+        for row, rank in enumerate(ranks):
+            col = 0
+            for char in rank:
+                if char in "12345678":
+                    col += int(char)
+                    continue
+                if char not in FEN_PIECES or col >= TILES_IN_ROW:
+                    raise ValueError(f"Invalid FEN piece placement, bad rank {TILES_IN_ROW - row} '{rank}': {fen}")
+                color = "w" if char.isupper() else "b"
+                squares[row * TILES_IN_ROW + col] = encode_piece(color, char.lower())
+                if char.lower() == "k":
+                    kings[color].append((col, row))
+                col += 1
+            if col != TILES_IN_ROW:
+                raise ValueError(f"Invalid FEN piece placement, rank {TILES_IN_ROW - row} '{rank}' isn't "
+                                 f"{TILES_IN_ROW} squares wide: {fen}")
+
+        if len(kings["w"]) != 1 or len(kings["b"]) != 1:
+            raise ValueError(f"Invalid FEN piece placement, each side needs exactly one king: {fen}")
+
+        active_player = fields[1]
+        if active_player not in ("w", "b"):
+            raise ValueError(f"Invalid FEN side to move '{active_player}', expected w or b: {fen}")
+
+        castling = fields[2] if len(fields) > 2 else "-"
+        if castling != "-" and (castling.strip("KQkq") != "" or len(set(castling)) != len(castling)):
+            raise ValueError(f"Invalid FEN castling rights '{castling}': {fen}")
+
+        # A pushed pawn is one rank past the square, so white to move can only capture on rank 6 and black on rank 3
+        en_passant = fields[3] if len(fields) > 3 else "-"
+        if en_passant != "-" and (len(en_passant) != 2 or en_passant[0] not in "abcdefgh"
+                                  or en_passant[1] != ("6" if active_player == "w" else "3")):
+            raise ValueError(f"Invalid FEN en passant square '{en_passant}': {fen}")
+
+        clocks = fields[4:]
+        if any(not clock.isdigit() for clock in clocks) or (len(clocks) == 2 and int(clocks[1]) == 0):
+            raise ValueError(f"Invalid FEN move clocks '{' '.join(clocks)}': {fen}")
+
+        self.squares = squares
+        self.past_moves = []
+        self.game_over = None
+        self.whiteKingCoords = kings["w"][0]
+        self.blackKingCoords = kings["b"][0]
+        self.active_player = active_player
+
+        self.castling = 0
+        for right, char in CASTLING_CHARS:
+            if char in castling:
+                self.castling |= right
+
+        # Like make_move the square is only kept when a pawn can capture on it, so the key of the position is the same
+        # whether it was loaded or reached by playing the moves
+        self.en_passant = NO_EN_PASSANT
+        if en_passant != "-":
+            index = square_index(en_passant)
+            pushed = index + TILES_IN_ROW if active_player == "w" else index - TILES_IN_ROW
+            if self.can_capture_en_passant(pushed, PAWN | color_bit(active_player)):
+                self.en_passant = index
+
+        self.halfmove_clock = int(clocks[0]) if len(clocks) > 0 else 0
+        self.fullmove_number = int(clocks[1]) if len(clocks) > 1 else 1
+        self.hash = self.compute_hash()
+        self.compute_evaluation()
+
+    # Fn: can_capture_en_passant()
+    # Brief: Checks if a pawn that was just pushed two squares has a pawn beside it that can take it en passant
+    # Params: - pushed: The square the pushed pawn stands on
+    #         - pawn: The piece code of the pawn that would take it
+    def can_capture_en_passant(self, pushed, pawn):
+        col = pushed % TILES_IN_ROW
+        return (col > 0 and self.squares[pushed - 1] == pawn) or \
+            (col < TILES_IN_ROW - 1 and self.squares[pushed + 1] == pawn)
+
+    # Fn: to_fen()
+    # Brief: Writes the position as a FEN string
+    # Return: The FEN string
+    def to_fen(self):
+        ranks = []
+        for row in range(TILES_IN_ROW):
+            rank = ""
+            empty = 0
+            for col in range(TILES_IN_ROW):
+                piece = self.squares[row * TILES_IN_ROW + col]
+                if piece == EMPTY:
+                    empty += 1
+                    continue
+                if empty > 0:
+                    rank += str(empty)
+                    empty = 0
+                rank += piece_char(piece) if piece & BLACK else piece_char(piece).upper()
+            ranks.append(rank + str(empty) if empty > 0 else rank)
+
+        castling = "".join(char for right, char in CASTLING_CHARS if self.castling & right) or "-"
+        en_passant = square_name(self.en_passant) if self.en_passant != NO_EN_PASSANT else "-"
+        return f"{'/'.join(ranks)} {self.active_player} {castling} {en_passant} {self.halfmove_clock} {self.fullmove_number}"
+
+    # Fn: copy()
+    # Brief: Copies the position so that the search can mutate it without touching the in play board
+    # Return: Copy of the position
+    def copy(self):
+        copy = Position()
+
+        copy.squares = self.squares[:]
+        copy.past_moves = self.past_moves[:]
+        copy.active_player = self.active_player
+        copy.mg_score = self.mg_score
+        copy.eg_score = self.eg_score
+        copy.phase = self.phase
+        copy.files = self.files
+        copy.pawn_hash = self.pawn_hash
+        copy.game_over = self.game_over
+        copy.whiteKingCoords = self.whiteKingCoords
+        copy.blackKingCoords = self.blackKingCoords
+        copy.castling = self.castling
+        copy.en_passant = self.en_passant
+        copy.halfmove_clock = self.halfmove_clock
+        copy.fullmove_number = self.fullmove_number
+        copy.hash = self.hash
+
+        return copy
+
+    # Fn: to_compact()
+    # Brief: Takes an immutable snapshot of the position, the records of past moves are shared rather than copied.
+    # This is how a position is handed to a search, which works on its own Position rebuilt from the snapshot
+    # Return: CompactPosition that from_compact turns back into a Position
+    def to_compact(self):
+        return CompactPosition(bytes(self.squares), self.active_player, self.mg_score, self.eg_score, self.phase,
+                               self.files, self.pawn_hash, self.game_over, self.whiteKingCoords, self.blackKingCoords,
+                               self.castling, self.en_passant, self.halfmove_clock, self.fullmove_number, self.hash,
+                               tuple(self.past_moves))
+
+    # Fn: from_compact()
+    # Brief: Rebuilds a position from a snapshot taken by to_compact, the snapshot can be used again after
+    # Params: - compact: The CompactPosition from to_compact
+    # Return: The Position
+    @staticmethod
+    def from_compact(compact):
+        (squares, active_player, mg_score, eg_score, phase, files, pawn_hash, game_over, whiteKingCoords,
+         blackKingCoords, castling, en_passant, halfmove_clock, fullmove_number, key, records) = compact
+
+        position = Position()
+        position.squares = list(squares)
+        position.active_player = active_player
+        position.mg_score = mg_score
+        position.eg_score = eg_score
+        position.phase = phase
+        position.files = files
+        position.pawn_hash = pawn_hash
+        position.game_over = game_over
+        position.whiteKingCoords = whiteKingCoords
+        position.blackKingCoords = blackKingCoords
+        position.castling = castling
+        position.en_passant = en_passant
+        position.halfmove_clock = halfmove_clock
+        position.fullmove_number = fullmove_number
+        position.hash = key
+        position.past_moves = list(records)
+        return position
+
+    # Fn: piece_at()
+    # Brief: Gets the piece code at a coordinate
+    # Params: - coords: The x and y of the square
+    # Return: The piece code, which is EMPTY if there's no piece
+    def piece_at(self, coords):
+        x, y = coords
+        return self.squares[y * TILES_IN_ROW + x]
+
+    def piece_at_coords(self, coords):
+        return self.piece_at(coords) != EMPTY
+
+    # Fn: next_turn()
+    # Brief: Transitions the active player to the opposite color
+    def next_turn(self):
+        self.active_player = "w" if self.active_player == "b" else "b"
+        self.hash ^= ZOBRIST_BLACK_TO_MOVE
+
+    # Fn: make_move()
+    # Brief: Moves a piece from one square to another, which can defeat a piece in the process
+    # also saves the game state and appends it to the member property "past_moves" so that the
+    # move can be unmade very easily, then passes the turn to the other player
+    # Params: - Move: Packed move (see chess_move)
+    # Return: Boolean if the move was successful
+    def make_move(self, move):
+        from_index = move & SQUARE_MASK
+        to_index = (move >> TO_SHIFT) & SQUARE_MASK
+        piece = self.squares[from_index]
+        if piece == EMPTY:
+            return False
+        captured = self.squares[to_index]
+        captured_index = to_index
+        if move & EN_PASSANT_FLAG:
+            # The captured pawn is on the square the to square was passed over from
+            captured_index = to_index - TILES_IN_ROW if piece & BLACK else to_index + TILES_IN_ROW
+            captured = self.squares[captured_index]
+
+        promotion = move_promotion(move)
+        self.past_moves.append(UndoRecord(piece, captured, from_index, to_index, promotion, self.mg_score,
+                                          self.eg_score, self.phase, self.files, self.pawn_hash, self.game_over,
+                                          self.whiteKingCoords, self.blackKingCoords, self.hash, self.castling,
+                                          self.en_passant, self.halfmove_clock, self.fullmove_number))
+
+        # Set the current piece on the new square and/or morphs into the promoted piece
+        placed = piece
+        if promotion != EMPTY:
+            placed = promotion | (piece & BLACK)
+        self.squares[to_index] = placed
+        self.squares[from_index] = EMPTY
+
+        # Take the moved and captured pieces out of the key and put the placed piece in
+        self.hash ^= ZOBRIST_PIECES[piece][from_index] ^ ZOBRIST_PIECES[placed][to_index]
+        if captured != EMPTY:
+            if captured_index != to_index:
+                self.squares[captured_index] = EMPTY
+            self.hash ^= ZOBRIST_PIECES[captured][captured_index]
+
+        # The same for the terms of the evaluation, the tables hold nothing for an empty square
+        self.mg_score += MG_TABLES[placed][to_index] - MG_TABLES[piece][from_index] - MG_TABLES[captured][captured_index]
+        self.eg_score += EG_TABLES[placed][to_index] - EG_TABLES[piece][from_index] - EG_TABLES[captured][captured_index]
+        self.phase += PHASES[placed] - PHASES[piece] - PHASES[captured]
+        self.files += FILE_COUNTS[placed][to_index] - FILE_COUNTS[piece][from_index] - FILE_COUNTS[captured][captured_index]
+        self.pawn_hash ^= ZOBRIST_PAWNS[piece][from_index] ^ ZOBRIST_PAWNS[placed][to_index] ^ ZOBRIST_PAWNS[captured][captured_index]
+
+        if move & CASTLE_FLAG:
+            rook_from, rook_to = castle_rook_squares(from_index, to_index)
+            rook = self.squares[rook_from]
+            self.squares[rook_to] = rook
+            self.squares[rook_from] = EMPTY
+            self.hash ^= ZOBRIST_PIECES[rook][rook_from] ^ ZOBRIST_PIECES[rook][rook_to]
+            self.mg_score += MG_TABLES[rook][rook_to] - MG_TABLES[rook][rook_from]
+            self.eg_score += EG_TABLES[rook][rook_to] - EG_TABLES[rook][rook_from]
+            self.files += FILE_COUNTS[rook][rook_to] - FILE_COUNTS[rook][rook_from]
+
+        if piece & TYPE_MASK == KING:
+            if piece & BLACK:
+                self.blackKingCoords = index_to_coords(to_index)
+            else:
+                self.whiteKingCoords = index_to_coords(to_index)
+
+        # Moving a king or rook, or capturing a rook, can take away castling rights
+        castling = self.castling & CASTLING_MASKS[from_index] & CASTLING_MASKS[to_index]
+        if castling != self.castling:
+            self.hash ^= ZOBRIST_CASTLING[self.castling] ^ ZOBRIST_CASTLING[castling]
+            self.castling = castling
+
+        if self.en_passant != NO_EN_PASSANT:
+            self.hash ^= ZOBRIST_EN_PASSANT[self.en_passant % TILES_IN_ROW]
+            self.en_passant = NO_EN_PASSANT
+        if piece & TYPE_MASK == PAWN and abs(to_index - from_index) == 2 * TILES_IN_ROW:
+            # The square is only set when an enemy pawn is beside the pushed pawn to capture it, otherwise
+            # the same position would hash differently depending on how it was reached
+            if self.can_capture_en_passant(to_index, PAWN | ((piece & BLACK) ^ BLACK)):
+                self.en_passant = (from_index + to_index) // 2
+                self.hash ^= ZOBRIST_EN_PASSANT[to_index % TILES_IN_ROW]
+
+        self.halfmove_clock = 0 if piece & TYPE_MASK == PAWN or captured != EMPTY else self.halfmove_clock + 1
+        if piece & BLACK:
+            self.fullmove_number += 1
+
+        self.next_turn()
+        return True
+
+    # Fn: unmake_move()
+    # Brief: Pops the last element from the past_moves member and uses that to revert to the previous game state
+    # this function is used mainly in the minimax algorithm
+    def unmake_move(self):
+        last_state = self.past_moves.pop()   # Pops the last index of the past moves so that it can be undone
+
+        self.mg_score = last_state.mg_score
+        self.eg_score = last_state.eg_score
+        self.phase = last_state.phase
+        self.files = last_state.files
+        self.pawn_hash = last_state.pawn_hash
+        self.game_over = last_state.game_over
+
+        self.whiteKingCoords = last_state.whiteKingCoords
+        self.blackKingCoords = last_state.blackKingCoords
+
+        # The moved piece goes back as it was before any promotion
+        from_index = last_state.from_index
+        to_index = last_state.to_index
+        self.squares[from_index] = last_state.piece
+        if last_state.piece & TYPE_MASK == PAWN and to_index == last_state.en_passant:
+            # En passant, the to square was empty and the captured pawn goes back beside the from square
+            self.squares[to_index] = EMPTY
+            self.squares[to_index - TILES_IN_ROW if last_state.piece & BLACK else to_index + TILES_IN_ROW] = last_state.captured
+        else:
+            self.squares[to_index] = last_state.captured
+            if last_state.piece & TYPE_MASK == KING and abs(to_index - from_index) == 2:
+                rook_from, rook_to = castle_rook_squares(from_index, to_index)
+                self.squares[rook_from] = self.squares[rook_to]
+                self.squares[rook_to] = EMPTY
+
+        self.castling = last_state.castling
+        self.en_passant = last_state.en_passant
+        self.halfmove_clock = last_state.halfmove_clock
+        self.fullmove_number = last_state.fullmove_number
+
+        self.active_player = "w" if self.active_player == "b" else "b"
+        self.hash = last_state.hash
+
+    # Fn: make_null_move()
+    # Brief: Passes the turn without moving a piece, used by the null move pruning in the search. The record
+    # pushed to past_moves is marked so the search can tell it apart and unmake_null_move can undo it
+    def make_null_move(self):
+        self.past_moves.append(UndoRecord(EMPTY, EMPTY, -1, -1, EMPTY, self.mg_score, self.eg_score, self.phase,
+                                          self.files, self.pawn_hash, self.game_over, self.whiteKingCoords,
+                                          self.blackKingCoords, self.hash, self.castling, self.en_passant,
+                                          self.halfmove_clock, self.fullmove_number, True))
+        # The pawn that could have been captured en passant is safe once the turn passes
+        if self.en_passant != NO_EN_PASSANT:
+            self.hash ^= ZOBRIST_EN_PASSANT[self.en_passant % TILES_IN_ROW]
+            self.en_passant = NO_EN_PASSANT
+        self.next_turn()
+
+    # Fn: unmake_null_move()
+    # Brief: Undoes make_null_move, giving the turn back
+    def unmake_null_move(self):
+        last_state = self.past_moves.pop()
+        self.en_passant = last_state.en_passant
+        self.active_player = "w" if self.active_player == "b" else "b"
+        self.hash = last_state.hash
+
+    # Fn: has_non_pawn_material()
+    # Brief: Checks if a player has any piece other than its pawns and king, without one the player is likely
+    # to be in zugzwang where passing the turn would be better than any legal move
+    # Params: - color: The player to check
+    def has_non_pawn_material(self, color):
+        side = color_bit(color)
+        for piece in self.squares:
+            if piece != EMPTY and piece & BLACK == side and piece & TYPE_MASK not in (PAWN, KING):
+                return True
+        return False
+
+    # Fn: checkmate_stalemate()
+    # Brief: Checks the position to see if the game has ended by a checkmate or stalemate,
+    # both the legal moves and the check come from the attack tables
+    def checkmate_stalemate(self):
+        legal_moves = self.generate_moves(self.active_player, MoveList())
+
+        opponent = None
+        if self.active_player == "w":
+            opponent = "b"
+        else:
+            opponent = "w"
+
+        if len(legal_moves) == 0 and not self.in_check(self.active_player):
+            self.game_over = ("Stalemate", None)
+        elif len(legal_moves) == 0:
+            self.game_over = ("Checkmate", opponent)
+
+    # Fn: san()
+    # Brief: Writes a legal move of the position in standard algebraic notation such as Nbd7, exd5, e8=Q, O-O or Qh4#
+    # Params: - move: The packed move
+    # Return: The SAN string
+    def san(self, move):
+        from_index = move & SQUARE_MASK
+        to_index = (move >> TO_SHIFT) & SQUARE_MASK
+        piece = self.squares[from_index]
+        capture = "x" if move & CAPTURE_FLAG else ""
+
+        if move & CASTLE_FLAG:
+            name = "O-O" if to_index > from_index else "O-O-O"
+        elif piece & TYPE_MASK == PAWN:
+            name = (square_name(from_index)[0] if capture else "") + capture + square_name(to_index)
+            promotion = move_promotion(move)
+            if promotion != EMPTY:
+                name += "=" + piece_char(promotion).upper()
+        else:
+            # Name the file, the rank or both if another piece of the same type can also move to the square
+            others = [other & SQUARE_MASK for other in self.generate_moves(self.active_player, MoveList())
+                      if (other >> TO_SHIFT) & SQUARE_MASK == to_index and other & SQUARE_MASK != from_index
+                      and self.squares[other & SQUARE_MASK] == piece]
+            origin = square_name(from_index)
+            if len(others) == 0:
+                origin = ""
+            elif all(other % TILES_IN_ROW != from_index % TILES_IN_ROW for other in others):
+                origin = origin[0]
+            elif all(other // TILES_IN_ROW != from_index // TILES_IN_ROW for other in others):
+                origin = origin[1]
+            name = piece_char(piece).upper() + origin + capture + square_name(to_index)
+
+        self.make_move(move)
+        if self.in_check(self.active_player):
+            name += "#" if self.generate_moves(self.active_player, MoveList()).count == 0 else "+"
+        self.unmake_move()
+        return name
+
+    # Fn: parse_san()
+    # Brief: Finds the legal move a SAN string such as Nbd7, exd5, e8=Q or O-O stands for. Check and annotation marks,
+    # a missing capture sign or promotion sign and zeros written for the O of castling are all accepted since hand
+    # written PGN and EPD files vary
+    # Params: - san: The SAN string
+    # Return: The packed move, None if it isn't exactly one legal move
+    def parse_san(self, san):
+        text = re.sub(r"[+#!?x]", "", san).replace("0", "O")
+        moves = self.generate_moves(self.active_player, MoveList())
+        if text in ("O-O", "O-O-O"):
+            for move in moves:
+                if move & CASTLE_FLAG and (((move >> TO_SHIFT) & SQUARE_MASK) > (move & SQUARE_MASK)) == (text == "O-O"):
+                    return move
+            return None
+
+        promotion = EMPTY
+        if "=" in text:
+            text, promotion_char = text.split("=", 1)
+            if promotion_char not in ("Q", "R", "B", "N"):
+                return None
+            promotion = encode_piece("w", promotion_char.lower()) & TYPE_MASK
+        elif len(text) >= 3 and text[-1] in "QRBN" and text[-2] in "18":
+            promotion = encode_piece("w", text[-1].lower()) & TYPE_MASK
+            text = text[:-1]
+
+        piece_type = PAWN
+        if len(text) > 0 and text[0] in "KQRBN":
+            piece_type = encode_piece("w", text[0].lower()) & TYPE_MASK
+            text = text[1:]
+        if not re.fullmatch(r"[a-h]?[1-8]?[a-h][1-8]", text):
+            return None
+        to_index = square_index(text[-2:])
+        origin = text[:-2]
+
+        matches = []
+        for move in moves:
+            from_index = move & SQUARE_MASK
+            if ((move >> TO_SHIFT) & SQUARE_MASK != to_index or self.squares[from_index] & TYPE_MASK != piece_type
+                    or move_promotion(move) != promotion or move & CASTLE_FLAG):
+                continue
+            # The origin can be the file, the rank or both, each character has to match the from square
+            from_name = square_name(from_index)
+            if all(char == from_name[0] if char.isalpha() else char == from_name[1] for char in origin):
+                matches.append(move)
+        return matches[0] if len(matches) == 1 else None
+
+    # Fn: king_index()
+    # Brief: Gets the square index of a players king
+    def king_index(self, color):
+        x, y = self.blackKingCoords if color == "b" else self.whiteKingCoords
+        return y * TILES_IN_ROW + x
+
+    # Fn: is_square_attacked()
+    # Brief: Checks if the opponent of a player attacks a square
+    # Params: - coords: The coordinates of the square
+    #         - color: The color of the player being attacked
+    # Return: Boolean if the square is attacked
+    def is_square_attacked(self, coords, color):
+        x, y = coords
+        return is_square_attacked(self.squares, y * TILES_IN_ROW + x, color_bit(color) ^ BLACK)
+
+    # Fn: in_check()
+    # Brief: Checks the kings locations to see if there's any way they are in check
+    # Params: - color: The color of the players king that needs to be checked
+    # Return: Boolean if the players king is in check
+    def in_check(self, color):
+        return is_square_attacked(self.squares, self.king_index(color), color_bit(color) ^ BLACK)
+
+    # Fn: get_check_mask()
+    # Brief: Finds the squares that a piece other than the king can move to in order to get out of check
+    # Params: - king_index: The index of the players king
+    #         - side: The color bit of the player
+    # Return: None if not in check, otherwise the set of squares that capture or block the checking piece,
+    # which is empty when there's more than one checker since only the king can move then
+    def get_check_mask(self, king_index, side):
+        checkers = get_attackers(self.squares, king_index, side ^ BLACK)
+        if len(checkers) == 0:
+            return None
+        if len(checkers) > 1:
+            return set()
+
+        checker = checkers[0]
+        mask = {checker}
+        # Squares between a sliding checker and the king can be blocked
+        if self.squares[checker] & TYPE_MASK in (BISHOP, ROOK, QUEEN):
+            for ray in RAYS[king_index]:
+                if checker in ray:
+                    mask.update(ray[:ray.index(checker)])
+                    break
+        return mask
+
+    # Fn: get_pins()
+    # Brief: Looks out from the king in each direction for a piece of the player that's stuck between the
+    # king and an enemy slider, those pieces can only move along the line of the pin
+    # Params: - king_index: The index of the players king
+    #         - side: The color bit of the player
+    # Return: Dictionary with the index of the pinned piece as the key and the set of squares it can move to as the value
+    def get_pins(self, king_index, side):
+        pins = {}
+        squares = self.squares
+        enemy = side ^ BLACK
+        enemy_queen = QUEEN | enemy
+        for direction, ray in enumerate(RAYS[king_index]):
+            slider = (ROOK if direction in STRAIGHT_DIRECTIONS else BISHOP) | enemy
+            pinned = None
+            for distance, target in enumerate(ray):
+                piece = squares[target]
+                if piece == EMPTY:
+                    continue
+                if pinned is None and (piece & BLACK) == side:
+                    pinned = target
+                    continue
+                if pinned is not None and (piece == slider or piece == enemy_queen):
+                    pins[pinned] = set(ray[:distance + 1])
+                break
+        return pins
+
+    # Fn: randomize_moves()
+    # Brief: Randomizes each array of to moves in the dictionary of possible moves
+    # Params: = possible_moves: dictionary of possible moves
+    def randomize_moves(self, possible_moves):
+        for move_from in possible_moves:
+            moves_to = possible_moves[move_from]
+            random.shuffle(moves_to)
+
+    # Fn: generate_moves()
+    # Brief: Fills a move list with the legal packed moves of a player. The check mask and pins are worked out once
+    # up front so that each move is made legal with a set lookup instead of making the move and looking for check
+    # Params: - color: The player to generate the moves of
+    #         - move_list: The chess_move.MoveList to fill, it's cleared first
+    #         - captures_only: Only generate captures and queen promotions, for the quiescence search. Only the squares
+    #           each piece could capture on are looked at so the quiet moves are never generated. Castling is left out
+    # Return: The move list
+    def generate_moves(self, color, move_list, captures_only=False):
+        moves = move_list.moves
+        count = 0
+        side = color_bit(color)
+        enemy = side ^ BLACK
+        squares = self.squares
+
+        king_index = self.king_index(color)
+        check_mask = self.get_check_mask(king_index, side)
+        pins = self.get_pins(king_index, side)
+
+        for index in range(TILES_IN_ROW * TILES_IN_ROW):
+            piece = squares[index]
+            if piece == EMPTY or (piece & BLACK) != side:
+                continue
+
+            if captures_only:
+                targets = get_capture_targets(squares, index, side)
+                if len(targets) == 0:
+                    continue
+            else:
+                targets = PIECE_CLASSES[piece & TYPE_MASK].get_moves(squares, index, side)
+                if targets == None:
+                    continue
+
+            if index == king_index:
+                # The king is lifted off the board so that it can't hide behind itself from a slider
+                squares[king_index] = EMPTY
+                targets = [target for target in targets if not is_square_attacked(squares, target, enemy)]
+                squares[king_index] = piece
+            else:
+                # A pinned piece in check can only move to squares that are both on the pin and in the check mask
+                allowed = pins.get(index)
+                if check_mask is not None:
+                    allowed = check_mask if allowed is None else allowed & check_mask
+                if allowed is not None:
+                    targets = [target for target in targets if target in allowed]
+
+            promoting = piece & TYPE_MASK == PAWN and (index < 2 * TILES_IN_ROW or index >= TILES_IN_ROW * (TILES_IN_ROW - 2))
+            for target in targets:
+                move = index | (target << TO_SHIFT)
+                if squares[target] != EMPTY:
+                    move |= CAPTURE_FLAG
+                if promoting and (target < TILES_IN_ROW or target >= TILES_IN_ROW * (TILES_IN_ROW - 1)):
+                    for promotion in (PROMOTION_PIECES[:1] if captures_only else PROMOTION_PIECES):
+                        moves[count] = move | (promotion << PROMOTION_SHIFT)
+                        count += 1
+                else:
+                    moves[count] = move
+                    count += 1
+
+        en_passant = self.en_passant
+        if en_passant != NO_EN_PASSANT:
+            captured_index = en_passant - TILES_IN_ROW if side == BLACK else en_passant + TILES_IN_ROW
+            pawn = PAWN | side
+            for attacker in PAWN_ATTACKS[enemy][en_passant]:
+                if squares[attacker] != pawn:
+                    continue
+                # Both pawns leave the rank at once which can uncover a check the pins don't catch, so the capture is made to test it
+                squares[attacker] = EMPTY
+                squares[captured_index] = EMPTY
+                squares[en_passant] = pawn
+                legal = not is_square_attacked(squares, king_index, enemy)
+                squares[en_passant] = EMPTY
+                squares[captured_index] = PAWN | enemy
+                squares[attacker] = pawn
+                if legal:
+                    moves[count] = attacker | (en_passant << TO_SHIFT) | CAPTURE_FLAG | EN_PASSANT_FLAG
+                    count += 1
+
+        # The king can't castle out of check, through an attacked square or into check
+        if not captures_only and check_mask is None and self.castling:
+            for right, king_from, king_to, rook_from, rook_to, between in CASTLES[color]:
+                if (self.castling & right and king_index == king_from and squares[rook_from] == ROOK | side
+                        and all(squares[square] == EMPTY for square in between)
+                        and not is_square_attacked(squares, rook_to, enemy) and not is_square_attacked(squares, king_to, enemy)):
+                    moves[count] = king_from | (king_to << TO_SHIFT) | CASTLE_FLAG
+                    count += 1
+
+        move_list.count = count
+        return move_list
+
+    # Fn: get_possible_moves()
+    # Brief: Gets the legal moves of a player for the gui as a dictionary with the from location as the key and
+    # the value being a list of possible to locations
+    # Return: The dictionary of possible moves in the position for the provided color
+    def get_possible_moves(self, color, rand_moves=False):
+        moves = moves_to_dict(self.generate_moves(color, MoveList()))
+
+        if rand_moves:  # Useful for the ai so that it doesn't just make the same moves every single game
+            self.randomize_moves(moves)
+
+        return moves
@@ -0,0 +1,328 @@
+import argparse, mmap, os, struct, sys, time
+from globals import TILES_IN_ROW
+from chess_piece import EMPTY, PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING, BLACK, TYPE_MASK, KING_TARGETS, RAYS, PAWN_ATTACKS
+from chess_piece import STRAIGHT_DIRECTIONS, piece_char
+from chess_position import Position
+from chess_move import MoveList
+
+# Precomputed results for the endings of a king and one piece against a bare king (KQK, KRK and KPK). Each table is built
+# backwards from the checkmates, so every position gets the exact number of plies to mate with best play, or 0 when it's
+# a draw. That's one byte per position instead of a single win bit, so the search can pick the fastest mate straight
+# from the table instead of having to find it, and the three tables still only come to about 1.5MB.
+#
+# The tables are built with the stronger side as white, a position with black as the stronger side is mirrored first.
+# A position's index is ((side to move * 64 + strong king) * 64 + weak king) * 64 + piece, where the side to move is 0
+# for the stronger side and 1 for the bare king. The file is memory mapped so only the pages a probe touches are read.
+#   header: 8 byte magic, 4 byte version, 4 byte table count
+#   then for each table: 4 byte piece type, 4 byte offset of the table from the start of the file
+
+TABLES_MAGIC = b"CHESSEG\0"
+TABLES_VERSION = 1
+HEADER = struct.Struct(">8sII")
+TABLE_ENTRY = struct.Struct(">II")
+SQUARES = TILES_IN_ROW * TILES_IN_ROW
+TABLE_SIZE = 2 * SQUARES * SQUARES * SQUARES
+
+TABLE_PIECES = (QUEEN, ROOK, PAWN)     # Built in this order since the pawn table needs the other two for promotions
+DEFAULT_TABLES_PATH = "./endgame_tables.bin"
+MAX_PLIES = 254         # The most plies to mate a byte can hold, none of these endings come close
+NEVER_LOST = 1 << 30    # Move count of a bare king position that can't be lost, it can take the piece or is stalemate
+
+ADJACENT = [set(targets) for targets in KING_TARGETS]
+
+# Fn: build_between()
+# Brief: Builds the squares between every pair of squares a slider could move along
+# Params: - directions: The indexes into RAYS the slider moves in
+# Return: List indexed by from square then to square, holding a tuple of the squares in between, or None if
+# the squares aren't on a line the slider moves along
+def build_between(directions):
+    between = [[None] * SQUARES for _ in range(SQUARES)]
+    for index in range(SQUARES):
+        for direction in directions:
+            ray = RAYS[index][direction]
+            for distance, target in enumerate(ray):
+                between[index][target] = tuple(ray[:distance])
+    return between
+
+BETWEEN = {QUEEN: build_between(range(8)), ROOK: build_between(STRAIGHT_DIRECTIONS)}
+
+# Fn: piece_attacks()
+# Brief: Checks if the strong side's piece attacks a square, the strong king is the only piece that can be in the way
+# since the bare king is either the square being looked at or has moved off the line
+# Params: - piece_type: QUEEN, ROOK or PAWN
+#         - piece_index, target, strong_king: Square indexes
+def piece_attacks(piece_type, piece_index, target, strong_king):
+    if piece_type == PAWN:
+        return target in PAWN_ATTACKS[0][piece_index]
+    between = BETWEEN[piece_type][piece_index][target]
+    return between is not None and strong_king not in between
+
+# Fn: table_index()
+# Brief: The index of a position in a table, see the comment at the top
+def table_index(weak_to_move, strong_king, weak_king, piece_index):
+    return ((weak_to_move * SQUARES + strong_king) * SQUARES + weak_king) * SQUARES + piece_index
+
+# Fn: is_legal()
+# Brief: Checks if a position of a table can happen, the pieces are on different squares, the kings aren't touching,
+# a pawn isn't on the first or last rank and the bare king isn't in check when it's the stronger side to move
+def is_legal(piece_type, weak_to_move, strong_king, weak_king, piece_index):
+    if strong_king == weak_king or piece_index == strong_king or piece_index == weak_king or weak_king in ADJACENT[strong_king]:
+        return False
+    if piece_type == PAWN and not TILES_IN_ROW <= piece_index < SQUARES - TILES_IN_ROW:
+        return False
+    return weak_to_move or not piece_attacks(piece_type, piece_index, weak_king, strong_king)
+
+# Fn: weak_moves()
+# Brief: Counts the moves of the bare king, a position where it can take the piece or is stalemated is never lost
+# Return: Tuple of the number of moves (NEVER_LOST in those cases) and if the bare king is in checkmate
+def weak_moves(piece_type, strong_king, weak_king, piece_index):
+    moves = 0
+    for target in KING_TARGETS[weak_king]:
+        if target == strong_king or target in ADJACENT[strong_king]:
+            continue
+        if target == piece_index:
+            if piece_index not in ADJACENT[strong_king]:
+                return NEVER_LOST, False   # The piece isn't defended and gets taken, only the kings are left
+            continue
+        if not piece_attacks(piece_type, piece_index, target, strong_king):
+            moves += 1
+
+    if moves == 0:
+        if piece_attacks(piece_type, piece_index, weak_king, strong_king):
+            return 0, True
+        return NEVER_LOST, False   # Stalemate
+    return moves, False
+
+# Fn: strong_predecessors()
+# Brief: The positions with the stronger side to move that lead to a position with the bare king to move
+# Return: Generator of table indexes, only legal positions are given
+def strong_predecessors(piece_type, strong_king, weak_king, piece_index):
+    # The king stepped here
+    for previous in KING_TARGETS[strong_king]:
+        if previous != weak_king and previous != piece_index and previous not in ADJACENT[weak_king] \
+                and not piece_attacks(piece_type, piece_index, weak_king, previous):
+            yield table_index(0, previous, weak_king, piece_index)
+
+    occupied = (strong_king, weak_king)
+    if piece_type == PAWN:
+        # The pawn pushed here, one square or two from its starting rank
+        previous = piece_index + TILES_IN_ROW
+        if previous < SQUARES - TILES_IN_ROW and previous not in occupied:
+            if not piece_attacks(PAWN, previous, weak_king, strong_king):
+                yield table_index(0, strong_king, weak_king, previous)
+            start = previous + TILES_IN_ROW
+            if start // TILES_IN_ROW == TILES_IN_ROW - 2 and start not in occupied \
+                    and not piece_attacks(PAWN, start, weak_king, strong_king):
+                yield table_index(0, strong_king, weak_king, start)
+        return
+
+    # The piece slid here, back along every line it moves on until a king is in the way
+    directions = range(8) if piece_type == QUEEN else STRAIGHT_DIRECTIONS
+    for direction in directions:
+        for previous in RAYS[piece_index][direction]:
+            if previous in occupied:
+                break
+            if not piece_attacks(piece_type, previous, weak_king, strong_king):
+                yield table_index(0, strong_king, weak_king, previous)
+
+# Fn: build_table()
+# Brief: Builds the table of one ending backwards from its checkmates. Positions are settled in order of plies to mate,
+# a position with the stronger side to move is won as soon as one move reaches a lost position, and a bare king
+# position is lost once every one of its moves reaches a won position
+# Params: - piece_type: QUEEN, ROOK or PAWN
+#         - promotion_tables: For the pawn table, dictionary of the finished queen and rook tables
+# Return: bytearray of the table, plies to mate plus one for won and lost positions, 0 for draws and illegal positions
+def build_table(piece_type, promotion_tables=None):
+    values = bytearray(TABLE_SIZE)
+    counts = [0] * (SQUARES * SQUARES * SQUARES)    # Moves left that haven't been shown to lose, for bare king positions
+    buckets = [[] for _ in range(MAX_PLIES + 2)]    # Positions waiting to be settled, by plies to mate
+
+    for strong_king in range(SQUARES):
+        for weak_king in range(SQUARES):
+            for piece_index in range(SQUARES):
+                if not is_legal(piece_type, 1, strong_king, weak_king, piece_index):
+                    continue
+                moves, mate = weak_moves(piece_type, strong_king, weak_king, piece_index)
+                counts[table_index(0, strong_king, weak_king, piece_index)] = moves
+                if mate:
+                    buckets[0].append(table_index(1, strong_king, weak_king, piece_index))
+
+                # A pawn on the seventh can promote, the queen and rook tables already know how those positions end
+                if piece_type == PAWN and piece_index < 2 * TILES_IN_ROW and is_legal(PAWN, 0, strong_king, weak_king, piece_index):
+                    promotion_index = piece_index - TILES_IN_ROW
+                    if promotion_index in (strong_king, weak_king):
+                        continue
+                    for table in promotion_tables.values():
+                        value = table[table_index(1, strong_king, weak_king, promotion_index)]
+                        if value:
+                            buckets[min(value, MAX_PLIES)].append(table_index(0, strong_king, weak_king, piece_index))
+
+    for plies in range(MAX_PLIES + 1):
+        for index in buckets[plies]:
+            if values[index]:
+                continue
+            values[index] = plies + 1
+            rest, piece_index = divmod(index, SQUARES)
+            rest, weak_king = divmod(rest, SQUARES)
+            weak_to_move, strong_king = divmod(rest, SQUARES)
+
+            if weak_to_move:
+                # Lost for the bare king, so every move into it wins for the stronger side
+                for previous in strong_predecessors(piece_type, strong_king, weak_king, piece_index):
+                    if not values[previous]:
+                        buckets[plies + 1].append(previous)
+            else:
+                # Won for the stronger side, the bare king positions that can move into it have one less way out
+                for previous in KING_TARGETS[weak_king]:
+                    if previous == piece_index or previous == strong_king or previous in ADJACENT[strong_king]:
+                        continue
+                    counts_index = table_index(0, strong_king, previous, piece_index)
+                    counts[counts_index] -= 1
+                    if counts[counts_index] == 0:
+                        buckets[plies + 1].append(table_index(1, strong_king, previous, piece_index))
+    return values
+
+# Fn: build_tables()
+# Brief: Builds every table and writes them to one file
+# Params: - path: The file to write
+# Return: Dictionary of piece type to a tuple of the won positions, the lost positions and the longest mate in plies
+def build_tables(path=DEFAULT_TABLES_PATH):
+    tables = {}
+    stats = {}
+    for piece_type in TABLE_PIECES:
+        tables[piece_type] = build_table(piece_type, tables)
+        half = TABLE_SIZE // 2
+        strong, weak = tables[piece_type][:half], tables[piece_type][half:]
+        stats[piece_type] = (half - strong.count(0), half - weak.count(0), max(tables[piece_type]) - 1)
+
+    with open(path, "wb") as tables_file:
+        tables_file.write(HEADER.pack(TABLES_MAGIC, TABLES_VERSION, len(tables)))
+        offset = HEADER.size + TABLE_ENTRY.size * len(tables)
+        for piece_type in tables:
+            tables_file.write(TABLE_ENTRY.pack(piece_type, offset))
+            offset += TABLE_SIZE
+        for piece_type in tables:
+            tables_file.write(tables[piece_type])
+    return stats
+
+# The tables file opened for probing
+class EndgameTables:
+    # Params: - path: The file from build_tables
+    def __init__(self, path=DEFAULT_TABLES_PATH):
+        self.file = open(path, "rb")
+        self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, version, count = HEADER.unpack_from(self.map, 0)
+        if magic != TABLES_MAGIC or version != TABLES_VERSION:
+            self.close()
+            raise ValueError(f"{path} isn't an endgame tables file of version {TABLES_VERSION}")
+        self.offsets = {}   # piece type -> offset of its table
+        for i in range(count):
+            piece_type, offset = TABLE_ENTRY.unpack_from(self.map, HEADER.size + i * TABLE_ENTRY.size)
+            self.offsets[piece_type] = offset
+
+    # Fn: probe()
+    # Brief: Looks a position up, it's covered if it's two bare kings, a king and a knight or bishop against a king
+    # or one of the endings in the file
+    # Params: - position: The Position
+    # Return: None if the position isn't covered, otherwise a tuple of the winning color (None for a draw)
+    # and the plies to mate with best play
+    def probe(self, position):
+        squares = position.squares
+        if SQUARES - squares.count(EMPTY) > 3:
+            return None
+
+        kings = {}
+        extra = None
+        for index, piece in enumerate(squares):
+            if piece == EMPTY:
+                continue
+            if piece & TYPE_MASK == KING:
+                kings[piece & BLACK] = index
+            elif extra is None:
+                extra = (index, piece)
+            else:
+                return None
+
+        if len(kings) < 2:
+            return None
+        if extra is None:
+            return None, 0   # Only the kings are left
+        piece_index, piece = extra
+        if piece & TYPE_MASK in (KNIGHT, BISHOP):
+            return None, 0   # A lone knight or bishop can't mate
+        offset = self.offsets.get(piece & TYPE_MASK)
+        if offset is None:
+            return None
+
+        strong = piece & BLACK
+        strong_king, weak_king = kings[strong], kings[strong ^ BLACK]
+        if strong == BLACK:
+            # The tables have the stronger side as white moving up the board, so the ranks are flipped
+            strong_king ^= SQUARES - TILES_IN_ROW
+            weak_king ^= SQUARES - TILES_IN_ROW
+            piece_index ^= SQUARES - TILES_IN_ROW
+        strong_color = "b" if strong == BLACK else "w"
+        weak_to_move = 0 if position.active_player == strong_color else 1
+
+        value = self.map[offset + table_index(weak_to_move, strong_king, weak_king, piece_index)]
+        if value == 0:
+            return None, 0
+        return strong_color, value - 1
+
+    # Fn: close()
+    # Brief: Unmaps and closes the file
+    def close(self):
+        self.map.close()
+        self.file.close()
+
+default_tables = None   # The tables of this process, opened once by load_default_tables
+
+# Fn: load_default_tables()
+# Brief: Opens the tables at DEFAULT_TABLES_PATH the first time it's called in a process
+# Return: The EndgameTables, or None if the file hasn't been built
+def load_default_tables():
+    global default_tables
+    if default_tables is None and os.path.exists(DEFAULT_TABLES_PATH):
+        default_tables = EndgameTables(DEFAULT_TABLES_PATH)
+    return default_tables
+
+def main():
+    parser = argparse.ArgumentParser(description="Builds and probes the KQK, KRK and KPK endgame tables")
+    commands = parser.add_subparsers(dest="command", required=True)
+    build_parser = commands.add_parser("build", help="Builds the tables")
+    build_parser.add_argument("--output", "-o", default=DEFAULT_TABLES_PATH, help="The file to write")
+    probe_parser = commands.add_parser("probe", help="Prints the result of a position and each of its moves")
+    probe_parser.add_argument("fen", help="The position")
+    probe_parser.add_argument("--tables", default=DEFAULT_TABLES_PATH, help="The tables file")
+    args = parser.parse_args()
+
+    if args.command == "build":
+        start = time.perf_counter()
+        stats = build_tables(args.output)
+        for piece_type, (won, lost, longest) in stats.items():
+            print(f"K{piece_char(piece_type).upper()}K: {won} won with the stronger side to move, {lost} lost with the "
+                  f"bare king to move, longest mate {longest} plies")
+        print(f"Wrote {args.output} in {time.perf_counter() - start:.1f}s")
+        return 0
+
+    tables = EndgameTables(args.tables)
+    position = Position()
+    position.load_fen(args.fen)
+    result = tables.probe(position)
+    if result is None:
+        print("Position isn't in the tables")
+        return 1
+    winner, plies = result
+    print("Draw" if winner is None else f"{winner} mates in {plies} plies")
+    for move in position.generate_moves(position.active_player, MoveList()):
+        san = position.san(move)
+        position.make_move(move)
+        winner, plies = tables.probe(position)
+        position.unmake_move()
+        print(f"  {san:<8} {'draw' if winner is None else f'{winner} mates in {plies + 1} plies'}")
+    tables.close()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,189 @@
+import multiprocessing, queue, threading
+from concurrent.futures import Future
+from ai import iterative_deepening, SearchInfo
+from chess_position import Position
+from transposition import TranspositionTable
+from parallel_search import ParallelSearch
+from endgame_tables import load_default_tables
+
+# Runs the ai in its own process so the search never competes with the pygame loop for the GIL. The gui asks for a
+# search with EngineWorker.search and gets a SearchHandle back straight away, the handle's future is completed with
+# the SearchResult and the SearchInfo of every finished iteration is put on its updates queue as the search runs.
+# The counters of the engine's transposition table come back with the result, so the table size can be tuned from them.
+#
+# Searches are numbered in the order they're asked for and the engine runs them one at a time. Stopping is done
+# through one shared value holding the newest id told to stop, every search with an id up to it ends at its next
+# check and reports the best move of its last finished iteration. Asking for a new search doesn't stop the old one
+
+SEARCH = "search"   # Commands sent to the engine process
+QUIT = "quit"
+INFO = "info"       # Messages sent back from it
+DONE = "done"
+
+# Fn: engine_main()
+# Brief: The loop of the engine process, runs each search it's sent and posts the progress and results back
+# Params: - commands: Queue the searches are read from
+#         - messages: Queue the SearchInfos and SearchResults are put on
+#         - stop_value: Shared value holding the id of the newest search told to stop
+#         - workers: Processes to split each search across, with 1 the search runs in the engine process itself
+#         - tt_size_mb: Memory budget of the transposition table, it's kept between searches
+def engine_main(commands, messages, stop_value, workers, tt_size_mb):
+    tt = TranspositionTable(tt_size_mb)
+    parallel = ParallelSearch(workers, stop_value=stop_value) if workers > 1 else None
+
+    try:
+        while True:
+            command = commands.get()
+            if command[0] == QUIT:
+                break
+
+            _, search_id, compact, maximizing_color, time_limit, node_limit, max_depth, settings = command
+            if stop_value.value >= search_id:
+                # Stopped before it started, there's no iteration to report a move from
+                messages.put((DONE, search_id, (None, None)))
+                continue
+
+            position = Position.from_compact(compact)
+            tt_stats = None     # The workers have tables of their own, the one here isn't used by a parallel search
+            if parallel is not None:
+                # The workers each search a share of the root moves, so only the merged result is reported
+                result = parallel.search(position, maximizing_color, time_limit, node_limit, max_depth, search_id, **settings)
+                messages.put((INFO, search_id, SearchInfo(result.depth, result.score, result.pv, result.nodes, result.time)))
+            else:
+                tt.new_search()
+                result = iterative_deepening(position, maximizing_color, time_limit, node_limit, max_depth, tt,
+                                             stop=lambda: stop_value.value >= search_id,
+                                             on_iteration=lambda info: messages.put((INFO, search_id, info)),
+                                             endgame_tables=load_default_tables(), **settings)
+                tt_stats = tt.get_stats()
+            messages.put((DONE, search_id, (result, tt_stats)))
+    finally:
+        if parallel is not None:
+            parallel.shutdown()
+        messages.put((QUIT, None, None))
+
+# The gui side of one search
+class SearchHandle:
+    def __init__(self, worker, search_id):
+        self.worker = worker
+        self.search_id = search_id
+        self.future = Future()          # Completed with the SearchResult, or None if the search was stopped before it started
+        self.updates = queue.Queue()    # SearchInfo of every finished iteration, read by the gui thread
+        self.tt_stats = None    # TranspositionTable.get_stats() of the engine once the search is done, None for a parallel search
+
+    # Fn: stop()
+    # Brief: Tells the search to finish now, the future still gets the best move found so far
+    def stop(self):
+        self.worker.stop(self.search_id)
+
+    # Fn: cancel()
+    # Brief: Stops the search and throws its result away, the future is cancelled
+    def cancel(self):
+        self.future.cancel()
+        self.stop()
+
+    # Fn: done()
+    # Brief: Checks if the search has finished or been cancelled
+    def done(self):
+        return self.future.done()
+
+    # Fn: result()
+    # Brief: Waits for the SearchResult of the search
+    # Params: - timeout: Seconds to wait, None to wait until it's done
+    def result(self, timeout=None):
+        return self.future.result(timeout)
+
+    # Fn: get_updates()
+    # Brief: Takes every SearchInfo that has arrived since the last call without waiting
+    # Return: List of SearchInfos, oldest first
+    def get_updates(self):
+        updates = []
+        while True:
+            try:
+                updates.append(self.updates.get_nowait())
+            except queue.Empty:
+                return updates
+
+class EngineWorker:
+    # Params: - workers: Processes to split each search across, the engine process searches by itself with 1
+    #         - tt_size_mb: Memory budget of the engine's transposition table
+    def __init__(self, workers=1, tt_size_mb=64):
+        # Spawned rather than forked for the same reason as the parallel search pool, see parallel_search.make_executor
+        context = multiprocessing.get_context("spawn")
+        self.commands = context.Queue()
+        self.messages = context.Queue()
+        self.stop_value = context.RawValue("q", 0)
+
+        self.next_id = 0
+        self.handles = {}   # search id -> SearchHandle of the searches that haven't finished
+        self.lock = threading.Lock()
+
+        self.process = context.Process(target=engine_main, args=(self.commands, self.messages, self.stop_value, workers,
+                                                                 tt_size_mb))
+        self.process.start()
+
+        # Waits on the messages from the engine so the handles get them without the gui having to poll
+        self.listener = threading.Thread(target=self.listen, daemon=True)
+        self.listener.start()
+
+    # Fn: search()
+    # Brief: Sends a position to the engine to be searched, returns without waiting for it
+    # Params: - snapshot: chess_position.CompactPosition of the position to search, from Board.snapshot or
+    #           Position.to_compact. It can't change, so the game carries on while the engine searches it
+    #         - maximizing_color: The color the search is finding a move for
+    #         - time_limit: Seconds the search can take, None to search until it's stopped or reaches max_depth
+    #         - node_limit: Nodes the search can visit, None for no limit
+    #         - max_depth: The deepest iteration to run
+    #         - settings: The selective search switches of ai.iterative_deepening (null_move, lmr, pvs, aspiration)
+    # Return: The SearchHandle of the search
+    def search(self, snapshot, maximizing_color, time_limit=None, node_limit=None, max_depth=64, **settings):
+        with self.lock:
+            self.next_id += 1
+            handle = SearchHandle(self, self.next_id)
+            self.handles[handle.search_id] = handle
+        self.commands.put((SEARCH, handle.search_id, snapshot, maximizing_color, time_limit, node_limit,
+                           max_depth, settings))
+        return handle
+
+    # Fn: stop()
+    # Brief: Stops a search and every one asked for before it
+    # Params: - search_id: The id of the search
+    def stop(self, search_id):
+        with self.lock:
+            if search_id > self.stop_value.value:
+                self.stop_value.value = search_id
+
+    # Fn: listen()
+    # Brief: The loop of the listener thread, hands each message from the engine to the handle it's for
+    def listen(self):
+        while True:
+            kind, search_id, payload = self.messages.get()
+            if kind == QUIT:
+                break
+
+            with self.lock:
+                handle = self.handles.get(search_id)
+                if kind == DONE:
+                    self.handles.pop(search_id, None)
+            if handle is None:
+                continue
+
+            if kind == INFO:
+                handle.updates.put(payload)
+            elif kind == DONE and not handle.future.done():
+                result, handle.tt_stats = payload
+                handle.future.set_result(result)
+
+    # Fn: shutdown()
+    # Brief: Stops every search and the engine process
+    def shutdown(self):
+        self.stop(self.next_id)
+        self.commands.put((QUIT,))
+        self.process.join()
+        self.listener.join()
+
+        # Searches that were never reported back are cancelled so nothing waits on them forever
+        with self.lock:
+            for handle in self.handles.values():
+                handle.future.cancel()
+            self.handles.clear()
@@ -0,0 +1,144 @@
+import argparse, re, sys, time
+from ai import iterative_deepening
+from chess_position import Position
+from chess_move import MoveList, move_name
+from transposition import TranspositionTable
+from parallel_search import ParallelSearch
+from endgame_tables import load_default_tables
+
+# Runs the engine over a test suite in EPD format, such as Win at Chess, and reports how many of the positions it
+# solves. Each line is a FEN without the clocks followed by operations, the ones used here are bm (the best moves),
+# am (moves to avoid) and id (the name of the position), for example:
+#   2rr3k/pp3pp1/1nnqbN1p/3pN3/2pP4/2P3Q1/PPB4P/R4RK1 w - - bm Qg6; id "WAC.001";
+# The file is read one line at a time so suites of any size can be run
+
+EPD_TT_SIZE_MB = 32     # Memory budget of the transposition table, it's cleared before every position
+OPERATION_PATTERN = re.compile(r'\s*([A-Za-z]\w*)((?:\s+(?:"[^"]*"|[^\s;"]+))*)\s*;')
+
+# Fn: parse_epd()
+# Brief: Splits an EPD record into the position and its operations
+# Params: - line: One line of an EPD file
+# Return: Tuple of the FEN and a dictionary of operation name to its list of operands, quotes are taken off the operands
+def parse_epd(line):
+    fields = line.split(None, 4)
+    if len(fields) < 4:
+        raise ValueError(f"Invalid EPD record: {line}")
+
+    operations = {}
+    for name, operands in OPERATION_PATTERN.findall(fields[4] if len(fields) > 4 else ""):
+        operations[name] = [operand.strip('"') for operand in re.findall(r'"[^"]*"|[^\s"]+', operands)]
+
+    # The half move clock and full move number can be given as operations instead of fields
+    halfmove_clock = operations.get("hmvc", ["0"])[0]
+    fullmove_number = operations.get("fmvn", ["1"])[0]
+    return " ".join(fields[:4] + [halfmove_clock, fullmove_number]), operations
+
+# Fn: find_moves()
+# Brief: Turns the moves of an operation into the legal packed moves of the position, SAN or coordinate notation is accepted
+# Params: - position: The position of the record
+#         - names: The moves as written in the record
+# Return: Set of packed moves, names that don't match a legal move are left out
+def find_moves(position, names):
+    moves = {position.parse_san(name) for name in names}
+    coordinates = {name.lower() for name in names}
+    moves |= {move for move in position.generate_moves(position.active_player, MoveList()) if move_name(move) in coordinates}
+    moves.discard(None)
+    return moves
+
+# Fn: run_epd()
+# Brief: Searches every position of an EPD file, a position is solved if the move played is one of the best moves and
+# none of the moves to avoid. The result of each position is printed as soon as it's searched
+# Params: - path: The EPD file
+#         - time_limit: Seconds per position, None to search to a fixed depth
+#         - node_limit: Nodes per position, None for no limit
+#         - max_depth: The deepest iteration to run
+#         - parallel: A ParallelSearch to search with, None to search in this process
+#         - limit: The most positions to run, None for the whole file
+# Return: Dictionary of totals, including the solve rate and the average seconds per position
+def run_epd(path, time_limit=None, node_limit=None, max_depth=64, parallel=None, limit=None):
+    tt = TranspositionTable(EPD_TT_SIZE_MB) if parallel is None else None
+    positions = 0
+    solved = 0
+    total_time = 0
+    total_nodes = 0
+    failed = []
+
+    with open(path) as epd_file:
+        for line_number, line in enumerate(epd_file, start=1):
+            line = line.strip()
+            if line == "" or line.startswith("#"):
+                continue
+            if limit is not None and positions >= limit:
+                break
+
+            fen, operations = parse_epd(line)
+            position = Position()
+            position.load_fen(fen)
+            name = operations.get("id", [f"line {line_number}"])[0]
+            best_moves = find_moves(position, operations.get("bm", []))
+            avoid_moves = find_moves(position, operations.get("am", []))
+
+            start = time.perf_counter()
+            if parallel is not None:
+                search = parallel.search(position, position.active_player, time_limit, node_limit, max_depth)
+            else:
+                tt.clear()
+                search = iterative_deepening(position, position.active_player, time_limit, node_limit, max_depth, tt,
+                                             endgame_tables=load_default_tables())
+            seconds = time.perf_counter() - start
+
+            played = position.san(search.best_move) if search.best_move is not None else "none"
+            is_solved = search.best_move is not None and (len(best_moves) == 0 or search.best_move in best_moves) \
+                and search.best_move not in avoid_moves
+            positions += 1
+            solved += is_solved
+            total_time += seconds
+            total_nodes += search.nodes
+            if not is_solved:
+                failed.append(name)
+
+            expected = "; ".join(f"{op} {' '.join(operations[op])}" for op in ("bm", "am") if op in operations)
+            print(f"{name:<16} {'ok' if is_solved else 'FAIL':<4} {played:<8} ({expected}) depth {search.depth:<2} "
+                  f"score {search.score:>7} {search.nodes:>9} nodes {seconds:6.2f}s")
+
+    return {
+        "positions": positions,
+        "solved": solved,
+        "solve_rate": solved / positions if positions else 0.0,
+        "seconds": total_time,
+        "seconds_per_position": total_time / positions if positions else 0.0,
+        "nodes": total_nodes,
+        "nps": total_nodes / total_time if total_time else 0,
+        "failed": failed
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Runs the engine over an EPD test suite and reports the solve rate")
+    parser.add_argument("path", help="The EPD file")
+    parser.add_argument("--time", type=float, help="Seconds per position, the default when no other budget is given is 1")
+    parser.add_argument("--depth", type=int, help="Search every position to this depth")
+    parser.add_argument("--nodes", type=int, help="Nodes per position")
+    parser.add_argument("--workers", type=int, default=1, help="Processes to split the root moves of each search across")
+    parser.add_argument("--limit", type=int, help="Only run the first positions of the file")
+    args = parser.parse_args()
+
+    time_limit = args.time
+    if time_limit is None and args.depth is None and args.nodes is None:
+        time_limit = 1.0
+    max_depth = args.depth if args.depth is not None else 64
+
+    parallel = ParallelSearch(args.workers) if args.workers > 1 else None
+    try:
+        summary = run_epd(args.path, time_limit, args.nodes, max_depth, parallel, args.limit)
+    finally:
+        if parallel is not None:
+            parallel.shutdown()
+
+    print(f"Solved {summary['solved']}/{summary['positions']} ({summary['solve_rate'] * 100:.1f}%), "
+          f"{summary['seconds_per_position']:.2f}s per position, {summary['nps']:.0f} nps")
+    if summary["failed"]:
+        print("Failed: " + ", ".join(summary["failed"]))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
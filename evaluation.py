@@ -0,0 +1,228 @@
+from globals import TILES_IN_ROW, piece_values
+from chess_piece import PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING, BLACK, TYPE_MASK, piece_char
+
+# The evaluation of a position, in the same units as piece_values where a pawn is worth 10. Every term is kept
+# from whites side, the search flips the sign for black.
+#
+# Most of it is kept up to date by Position.make_move rather than worked out at every node. The tables below are
+# indexed by piece code then square, so a move only has to add the value of the piece on its new square and take
+# away the old one. Each position holds:
+#   mg_score, eg_score: Material plus piece square values, once for the middlegame and once for the endgame
+#   phase:              How much of the non pawn material is left, blends between the two scores
+#   files:              How many pawns and rooks of each color are on each file, packed into one number
+#   pawn_hash:          Zobrist key of just the pawns, the pawn structure is cached by it since the pawns rarely move
+# Position.compute_evaluation works them out from scratch when a position is set up. Only the rooks on open files
+# and the pawn structure are worked out in evaluate, and the pawn structure is almost always already in the pawn table
+
+# Piece square tables from whites side with rank 8 first, the same order as the squares of the position.
+# Black uses the same tables with the ranks flipped
+PAWN_MG = [
+     0,  0,  0,  0,  0,  0,  0,  0,
+     5,  5,  5,  5,  5,  5,  5,  5,
+     1,  1,  2,  3,  3,  2,  1,  1,
+     0,  0,  1,  2,  2,  1,  0,  0,
+     0,  0,  0,  2,  2,  0,  0,  0,
+     0,  0, -1,  0,  0, -1,  0,  0,
+     0,  1,  1, -2, -2,  1,  1,  0,
+     0,  0,  0,  0,  0,  0,  0,  0
+]
+PAWN_EG = [
+     0,  0,  0,  0,  0,  0,  0,  0,
+     6,  6,  6,  6,  6,  6,  6,  6,
+     4,  4,  4,  4,  4,  4,  4,  4,
+     2,  2,  2,  2,  2,  2,  2,  2,
+     1,  1,  1,  1,  1,  1,  1,  1,
+     0,  0,  0,  0,  0,  0,  0,  0,
+     0,  0,  0,  0,  0,  0,  0,  0,
+     0,  0,  0,  0,  0,  0,  0,  0
+]
+KNIGHT_TABLE = [
+    -5, -4, -3, -3, -3, -3, -4, -5,
+    -4, -2,  0,  0,  0,  0, -2, -4,
+    -3,  0,  1,  2,  2,  1,  0, -3,
+    -3,  1,  2,  2,  2,  2,  1, -3,
+    -3,  0,  2,  2,  2,  2,  0, -3,
+    -3,  1,  1,  2,  2,  1,  1, -3,
+    -4, -2,  0,  1,  1,  0, -2, -4,
+    -5, -4, -3, -3, -3, -3, -4, -5
+]
+BISHOP_TABLE = [
+    -2, -1, -1, -1, -1, -1, -1, -2,
+    -1,  0,  0,  0,  0,  0,  0, -1,
+    -1,  0,  1,  1,  1,  1,  0, -1,
+    -1,  1,  1,  1,  1,  1,  1, -1,
+    -1,  0,  1,  1,  1,  1,  0, -1,
+    -1,  1,  1,  1,  1,  1,  1, -1,
+    -1,  1,  0,  0,  0,  0,  1, -1,
+    -2, -1, -1, -1, -1, -1, -1, -2
+]
+ROOK_TABLE = [
+     0,  0,  0,  0,  0,  0,  0,  0,
+     2,  2,  2,  2,  2,  2,  2,  2,
+    -1,  0,  0,  0,  0,  0,  0, -1,
+    -1,  0,  0,  0,  0,  0,  0, -1,
+    -1,  0,  0,  0,  0,  0,  0, -1,
+    -1,  0,  0,  0,  0,  0,  0, -1,
+    -1,  0,  0,  0,  0,  0,  0, -1,
+     0,  0,  0,  1,  1,  0,  0,  0
+]
+QUEEN_TABLE = [
+    -2, -1, -1, -1, -1, -1, -1, -2,
+    -1,  0,  0,  0,  0,  0,  0, -1,
+    -1,  0,  1,  1,  1,  1,  0, -1,
+     0,  0,  1,  1,  1,  1,  0,  0,
+     0,  0,  1,  1,  1,  1,  0,  0,
+    -1,  1,  1,  1,  1,  1,  0, -1,
+    -1,  0,  1,  0,  0,  0,  0, -1,
+    -2, -1, -1,  0,  0, -1, -1, -2
+]
+KING_MG = [
+    -3, -4, -4, -5, -5, -4, -4, -3,
+    -3, -4, -4, -5, -5, -4, -4, -3,
+    -3, -4, -4, -5, -5, -4, -4, -3,
+    -3, -4, -4, -5, -5, -4, -4, -3,
+    -2, -3, -3, -4, -4, -3, -3, -2,
+    -1, -2, -2, -2, -2, -2, -2, -1,
+     2,  2,  0,  0,  0,  0,  2,  2,
+     2,  3,  1,  0,  0,  1,  3,  2
+]
+KING_EG = [
+    -5, -4, -3, -2, -2, -3, -4, -5,
+    -3, -2, -1,  0,  0, -1, -2, -3,
+    -3, -1,  2,  3,  3,  2, -1, -3,
+    -3, -1,  3,  4,  4,  3, -1, -3,
+    -3, -1,  3,  4,  4,  3, -1, -3,
+    -3, -1,  2,  3,  3,  2, -1, -3,
+    -3, -3,  0,  0,  0,  0, -3, -3,
+    -5, -3, -3, -3, -3, -3, -3, -5
+]
+
+# Middlegame and endgame table of each type of piece
+PIECE_TABLES = {
+    PAWN: (PAWN_MG, PAWN_EG),
+    KNIGHT: (KNIGHT_TABLE, KNIGHT_TABLE),
+    BISHOP: (BISHOP_TABLE, BISHOP_TABLE),
+    ROOK: (ROOK_TABLE, ROOK_TABLE),
+    QUEEN: (QUEEN_TABLE, QUEEN_TABLE),
+    KING: (KING_MG, KING_EG)
+}
+
+# How much each piece counts towards the middlegame, the phase is the total of what's on the board.
+# With all of them on it's MAX_PHASE and the middlegame score is used, with none left it's the endgame score
+PHASE_WEIGHTS = {KNIGHT: 1, BISHOP: 1, ROOK: 2, QUEEN: 4}
+MAX_PHASE = 24
+
+# Pawn structure, the passed pawn bonus is by how many ranks the pawn has moved up the board
+DOUBLED_PAWN = (-1, -2)     # (middlegame, endgame) for every pawn after the first on a file
+ISOLATED_PAWN = (-1, -2)    # No pawns of the same color on the files beside it
+PASSED_PAWN_MG = [0, 0, 1, 1, 2, 3, 5, 0]
+PASSED_PAWN_EG = [0, 1, 2, 3, 5, 8, 12, 0]
+
+ROOK_OPEN_FILE = 2          # No pawns on the file
+ROOK_HALF_OPEN_FILE = 1     # Only enemy pawns on the file
+
+PAWN_TABLE_SIZE = 1 << 14   # Slots in the pawn structure cache, a power of two so the index is a bit mask
+
+# Fn: build_square_tables()
+# Brief: Builds the value of every piece code on every square from whites side, the material plus the piece square value
+# Params: - stage: 0 for the middlegame tables, 1 for the endgame ones
+# Return: List indexed by piece code then square
+def build_square_tables(stage):
+    tables = [[0] * (TILES_IN_ROW * TILES_IN_ROW) for _ in range((BLACK | KING) + 1)]
+    for piece_type, piece_tables in PIECE_TABLES.items():
+        material = piece_values.get(piece_char(piece_type), 0)
+        for index in range(TILES_IN_ROW * TILES_IN_ROW):
+            # Flipping the rank of the square gives the square from blacks side
+            tables[piece_type][index] = material + piece_tables[stage][index]
+            tables[piece_type | BLACK][index] = -(material + piece_tables[stage][index ^ (TILES_IN_ROW * (TILES_IN_ROW - 1))])
+    return tables
+
+MG_TABLES = build_square_tables(0)
+EG_TABLES = build_square_tables(1)
+PHASES = [PHASE_WEIGHTS.get(code & TYPE_MASK, 0) for code in range((BLACK | KING) + 1)]
+
+# The file counts are 4 bits for each file, a group of 8 files for each of the white pawns, black pawns,
+# white rooks and black rooks in that order. FILE_COUNTS holds what a piece adds to them from each square
+FILE_BITS = 4
+FILE_GROUP_BITS = FILE_BITS * TILES_IN_ROW
+FILE_GROUPS = {PAWN: 0, PAWN | BLACK: 1, ROOK: 2, ROOK | BLACK: 3}
+GROUP_MASK = (1 << FILE_GROUP_BITS) - 1
+FILE_LOW_BITS = int("0001" * TILES_IN_ROW, 2)   # The lowest bit of every file's count
+FILE_COUNTS = [[(1 << (FILE_GROUPS[code] * FILE_GROUP_BITS + (index % TILES_IN_ROW) * FILE_BITS)) if code in FILE_GROUPS else 0
+                for index in range(TILES_IN_ROW * TILES_IN_ROW)] for code in range((BLACK | KING) + 1)]
+
+pawn_table = [None] * PAWN_TABLE_SIZE   # Tuples of the pawn hash and the pawn structure score, see pawn_structure
+
+# Fn: occupied_files()
+# Brief: Turns one group of file counts into a mask with the lowest bit of every file's count set if it's not zero
+def occupied_files(counts):
+    return (counts | (counts >> 1) | (counts >> 2) | (counts >> 3)) & FILE_LOW_BITS
+
+# Fn: pawn_structure()
+# Brief: Scores the doubled, isolated and passed pawns, which only depend on where the pawns are
+# Params: - squares: The squares of the position
+# Return: Tuple of the middlegame and endgame score from whites side
+def pawn_structure(squares):
+    pawns = {PAWN: [], PAWN | BLACK: []}
+    for index, piece in enumerate(squares):
+        if piece in pawns:
+            pawns[piece].append(index)
+
+    mg_score = eg_score = 0
+    for code, sign in ((PAWN, 1), (PAWN | BLACK, -1)):
+        own_files = [0] * TILES_IN_ROW
+        for index in pawns[code]:
+            own_files[index % TILES_IN_ROW] += 1
+        enemies = pawns[code ^ BLACK]
+
+        for col, count in enumerate(own_files):
+            if count > 1:
+                mg_score += sign * DOUBLED_PAWN[0] * (count - 1)
+                eg_score += sign * DOUBLED_PAWN[1] * (count - 1)
+
+        for index in pawns[code]:
+            col, row = index % TILES_IN_ROW, index // TILES_IN_ROW
+            if (col == 0 or own_files[col - 1] == 0) and (col == TILES_IN_ROW - 1 or own_files[col + 1] == 0):
+                mg_score += sign * ISOLATED_PAWN[0]
+                eg_score += sign * ISOLATED_PAWN[1]
+
+            # Passed if no enemy pawn is in front of it on its own file or the files beside it
+            advanced = TILES_IN_ROW - 1 - row if code == PAWN else row
+            if not any(abs(enemy % TILES_IN_ROW - col) <= 1 and (enemy // TILES_IN_ROW < row if code == PAWN else enemy // TILES_IN_ROW > row)
+                       for enemy in enemies):
+                mg_score += sign * PASSED_PAWN_MG[advanced]
+                eg_score += sign * PASSED_PAWN_EG[advanced]
+    return mg_score, eg_score
+
+# Fn: evaluate()
+# Brief: Evaluates a position from the terms make_move keeps up to date, the pawn structure comes from the pawn table
+# Params: - position: The chess_position.Position
+# Return: The score from whites side
+def evaluate(position):
+    mg_score = position.mg_score
+    eg_score = position.eg_score
+
+    pawn_hash = position.pawn_hash
+    entry = pawn_table[pawn_hash & (PAWN_TABLE_SIZE - 1)]
+    if entry is None or entry[0] != pawn_hash:
+        entry = (pawn_hash, *pawn_structure(position.squares))
+        pawn_table[pawn_hash & (PAWN_TABLE_SIZE - 1)] = entry
+    mg_score += entry[1]
+    eg_score += entry[2]
+
+    # Rooks on files without pawns, a file with two rooks only counts once
+    files = position.files
+    if files >> (2 * FILE_GROUP_BITS):
+        white_pawns = occupied_files(files & GROUP_MASK)
+        black_pawns = occupied_files((files >> FILE_GROUP_BITS) & GROUP_MASK)
+        white_rooks = occupied_files((files >> (2 * FILE_GROUP_BITS)) & GROUP_MASK)
+        black_rooks = occupied_files(files >> (3 * FILE_GROUP_BITS))
+        open_files = ~(white_pawns | black_pawns)
+        rooks = (bin(white_rooks & open_files).count("1") - bin(black_rooks & open_files).count("1")) * ROOK_OPEN_FILE
+        rooks += (bin(white_rooks & ~white_pawns & black_pawns).count("1")
+                  - bin(black_rooks & ~black_pawns & white_pawns).count("1")) * ROOK_HALF_OPEN_FILE
+        mg_score += rooks
+        eg_score += rooks
+
+    phase = min(position.phase, MAX_PHASE)
+    return (mg_score * phase + eg_score * (MAX_PHASE - phase)) // MAX_PHASE
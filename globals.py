@@ -1,5 +1,4 @@
 import pygame, os
-from enum import Enum
 
 BLACK = (0, 0, 0)
 WHITE = (255, 255, 255)
@@ -17,15 +16,22 @@ def init_pieces_icons(dir):
         if file.is_file():
             imgs_dict[file.name] = file.path
             
-def draw_opaque_rect(screen, rect, color, alpha):
-    # Create a surface with per-pixel alpha transparency
-    s = pygame.Surface(pygame.Rect(rect).size, pygame.SRCALPHA)
-    # Fill the surface with the color and desired alpha value
-    s.fill((*color, alpha))
-    # Blit this surface onto the destination surface (which could be the mask layer)
-    screen.blit(s, (rect.x, rect.y))
+# Overlay surfaces by size, color and alpha, they're only ever blitted so each one is made once and shared
+overlay_cache = {}
+
+def get_overlay(size, color, alpha):
+    overlay = overlay_cache.get((size, color, alpha))
+    if overlay is None:
+        # Create a surface with per-pixel alpha transparency, filled with the color and desired alpha value
+        overlay = pygame.Surface(size, pygame.SRCALPHA)
+        overlay.fill((*color, alpha))
+        overlay_cache[(size, color, alpha)] = overlay
+    return overlay
 
-central_tiles = [(3, 4), (4, 4), (3, 4), (4, 3)]
+def draw_opaque_rect(screen, rect, color, alpha):
+    rect = pygame.Rect(rect)
+    # Blit the overlay onto the destination surface (which could be the mask layer)
+    screen.blit(get_overlay(rect.size, color, alpha), rect.topleft)
 
 # The value for each of the pieces
 piece_values = {
@@ -36,10 +42,3 @@ piece_values = {
     "q": 90,
     #"k": 900
 }
-
-class Position_Values(Enum):
-    CentralControl = 1
-    RookOpenTile = 2
-    RookOnSvnth = 2
-    OpenFile = 2
-    OpenRank = 1
\ No newline at end of file
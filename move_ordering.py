@@ -0,0 +1,116 @@
+from globals import piece_values
+from chess_piece import EMPTY, PAWN, KING, TYPE_MASK, piece_char
+from chess_move import TO_SHIFT, SQUARE_MASK, CAPTURE_FLAG, EN_PASSANT_FLAG, MOVE_BITS, MOVE_MASK, move_promotion, is_tactical
+
+# The order moves are tried in, from the first group to the last: the hash move, captures and promotions ordered
+# by most valuable victim then least valuable attacker, the two killer moves for the ply, then the quiet moves by history
+HASH_MOVE_SCORE = 10000000
+CAPTURE_SCORE = 1000000
+FIRST_KILLER_SCORE = 900000
+SECOND_KILLER_SCORE = 800000
+HISTORY_LIMIT = 700000  # History scores are kept below the killers
+
+KING_ORDER_VALUE = 1000 # The king has no entry in piece_values, capturing with it is tried after other captures
+MAX_PLY = 128
+
+# Fn: order_value()
+# Brief: The value of a piece code used to order captures
+def order_value(piece):
+    if piece & TYPE_MASK == KING:
+        return KING_ORDER_VALUE
+    return piece_values.get(piece_char(piece), 0)
+
+# Sits between the move generation of the position and the loops in minimax, it sorts the moves so that the
+# ones most likely to cause a cutoff are searched first and learns from the cutoffs that do happen
+class MoveOrderer:
+    def __init__(self):
+        self.killers = [[None, None] for _ in range(MAX_PLY)]
+        self.history = {}   # (color, packed move) -> score, grows every time a quiet move causes a cutoff
+
+        # Cutoff counters, a well ordered search gets most of its cutoffs from the first move it tries
+        self.cutoffs = 0
+        self.first_move_cutoffs = 0
+
+    # Fn: is_killer()
+    # Brief: Checks if a move is one of the killers for a ply
+    def is_killer(self, move, ply):
+        return ply < MAX_PLY and move in self.killers[ply]
+
+    # Fn: score_move()
+    # Brief: Gives a move a score where higher scores get searched first
+    # Params: - board: The position the move is being made in
+    #         - move: Packed move
+    #         - ply: How many moves from the root the position is
+    #         - hash_move: The best move from the transposition table or the previous iteration, None if there isn't one
+    # Return: The ordering score
+    def score_move(self, board, move, ply, hash_move):
+        if move == hash_move:
+            return HASH_MOVE_SCORE
+
+        if is_tactical(move):
+            # Most valuable victim first, then the least valuable attacker
+            squares = board.squares
+            victim_value = 0
+            if move & EN_PASSANT_FLAG:
+                victim_value = order_value(PAWN)
+            elif move & CAPTURE_FLAG:
+                victim_value = order_value(squares[(move >> TO_SHIFT) & SQUARE_MASK])
+            promotion = move_promotion(move)
+            if promotion != EMPTY:
+                victim_value += order_value(promotion)
+            return CAPTURE_SCORE + victim_value * 10 - order_value(squares[move & SQUARE_MASK])
+
+        if ply < MAX_PLY:
+            killers = self.killers[ply]
+            if move == killers[0]:
+                return FIRST_KILLER_SCORE
+            if move == killers[1]:
+                return SECOND_KILLER_SCORE
+
+        return self.history.get((board.active_player, move), 0)
+
+    # Fn: order_moves()
+    # Brief: Sorts the moves best first
+    # Params: - board: The position the moves are being made in
+    #         - moves: chess_move.MoveList of packed moves
+    #         - ply: How many moves from the root the position is
+    #         - hash_move: The move to always search first, None if there isn't one
+    # Return: The sorted list of moves
+    def order_moves(self, board, moves, ply, hash_move=None):
+        # The score is packed above the move so that the ints can be sorted directly, without a key function
+        keys = [(self.score_move(board, move, ply, hash_move) << MOVE_BITS) | move for move in moves]
+        keys.sort(reverse=True)
+        return [key & MOVE_MASK for key in keys]
+
+    # Fn: record_cutoff()
+    # Brief: Called when a move causes a beta cutoff, quiet moves become killers for the ply and gain history
+    # Params: - board: The position the move was made in
+    #         - move: The move that caused the cutoff
+    #         - move_number: The index of the move in the ordered list
+    #         - depth: The depth the move was searched to, deeper cutoffs are worth more
+    #         - ply: How many moves from the root the position is
+    def record_cutoff(self, board, move, move_number, depth, ply):
+        self.cutoffs += 1
+        if move_number == 0:
+            self.first_move_cutoffs += 1
+
+        if is_tactical(move):
+            return
+
+        if ply < MAX_PLY:
+            killers = self.killers[ply]
+            if killers[0] != move:
+                killers[1] = killers[0]
+                killers[0] = move
+
+        key = (board.active_player, move)
+        self.history[key] = self.history.get(key, 0) + depth * depth
+        if self.history[key] > HISTORY_LIMIT:
+            # Halve every score so the table keeps favouring recent cutoffs without passing the killers
+            for history_key in self.history:
+                self.history[history_key] //= 2
+
+    # Fn: first_move_cutoff_rate()
+    # Brief: The share of cutoffs that came from the first move searched
+    def first_move_cutoff_rate(self):
+        return self.first_move_cutoffs / self.cutoffs if self.cutoffs else 0.0
@@ -0,0 +1,193 @@
+import argparse, mmap, random, re, struct, sys
+from chess_position import Position, START_FEN
+from chess_move import MoveList, move_name
+
+# The opening book is a file of fixed size entries sorted by the zobrist key of the position they're for, so a position
+# is found with a binary search straight over the memory mapped file. Opening it reads nothing but the header and a
+# lookup only touches the few pages the search lands on, so even a large book costs nothing at startup.
+#   header: 8 byte magic, 4 byte version, 4 bytes unused
+#   entry:  8 byte zobrist key, 4 byte packed move, 4 byte weight, big endian
+# The keys are the ones from chess_position, if those ever change the book has to be built again
+
+BOOK_MAGIC = b"CHESSBK\0"
+BOOK_VERSION = 1
+HEADER = struct.Struct(">8sII")
+ENTRY = struct.Struct(">QII")
+KEY = struct.Struct(">Q")
+MAX_WEIGHT = (1 << 32) - 1
+
+BOOK_MAX_PLY = 20   # Moves past this many plies into a game aren't added to the book
+
+# What a move is worth for each game result, from the side of the player making it. A move only ever played in
+# lost games ends up with no weight and is left out of the book
+RESULT_WEIGHTS = {"1-0": {"w": 2, "b": 0}, "0-1": {"w": 0, "b": 2}, "1/2-1/2": {"w": 1, "b": 1}}
+UNKNOWN_RESULT_WEIGHT = 1
+
+# Fn: clean_movetext()
+# Brief: Strips the comments, variations, NAGs, move numbers and result from the movetext of a game
+# Params: - text: The movetext with its lines joined
+# Return: List of the SAN moves
+def clean_movetext(text):
+    text = re.sub(r"\{[^}]*\}", " ", text)
+    # Variations can be nested, so the innermost ones are removed until there are none left
+    previous = None
+    while previous != text:
+        previous = text
+        text = re.sub(r"\([^()]*\)", " ", text)
+    text = re.sub(r"\$\d+", " ", text)
+    text = re.sub(r"\d+\.(\.\.)?", " ", text)
+    return [token for token in text.split() if token not in ("1-0", "0-1", "1/2-1/2", "*")]
+
+# Fn: read_pgn_games()
+# Brief: Reads the games of a PGN file one at a time
+# Params: - path: The PGN file
+# Return: Generator of tuples of the dictionary of header tags and the list of SAN moves
+def read_pgn_games(path):
+    headers = {}
+    movetext = []
+    with open(path, encoding="utf-8", errors="replace") as pgn_file:
+        for line in pgn_file:
+            line = line.strip()
+            if line.startswith("%"):
+                continue
+            if line.startswith("["):
+                if movetext:
+                    yield headers, clean_movetext(" ".join(movetext))
+                    headers, movetext = {}, []
+                tag = re.match(r'\[(\w+)\s+"(.*)"\]', line)
+                if tag:
+                    headers[tag.group(1)] = tag.group(2)
+            elif line:
+                movetext.append(line.split(";", 1)[0])  # Everything after a semicolon is a comment
+    if movetext:
+        yield headers, clean_movetext(" ".join(movetext))
+
+# Fn: build_book()
+# Brief: Builds a book file from PGN games, every position in the first max_ply plies of each game gets the move
+# played from it, weighted by how the game went for the player that made it
+# Params: - pgn_paths: The PGN files to read
+#         - book_path: The book file to write
+#         - max_ply: How far into each game to go
+#         - min_games: Moves played in fewer games than this are left out
+# Return: Dictionary with the number of games read, the positions and the entries written
+def build_book(pgn_paths, book_path, max_ply=BOOK_MAX_PLY, min_games=1):
+    counts = {}     # (key, packed move) -> [games it was played in, weight]
+    games = 0
+    for path in pgn_paths:
+        for headers, sans in read_pgn_games(path):
+            games += 1
+            weights = RESULT_WEIGHTS.get(headers.get("Result"))
+            position = Position()
+            position.load_fen(headers.get("FEN", START_FEN))
+            for san in sans[:max_ply]:
+                move = position.parse_san(san)
+                if move is None:
+                    break   # The rest of a game with a move that can't be read is skipped
+                entry = counts.setdefault((position.hash, move), [0, 0])
+                entry[0] += 1
+                entry[1] += weights[position.active_player] if weights is not None else UNKNOWN_RESULT_WEIGHT
+                position.make_move(move)
+
+    entries = sorted((key, move, min(weight, MAX_WEIGHT)) for (key, move), (played, weight) in counts.items()
+                     if played >= min_games and weight > 0)
+    with open(book_path, "wb") as book_file:
+        book_file.write(HEADER.pack(BOOK_MAGIC, BOOK_VERSION, 0))
+        for entry in entries:
+            book_file.write(ENTRY.pack(*entry))
+
+    return {"games": games, "positions": len({key for key, _, _ in entries}), "entries": len(entries)}
+
+# A book file opened for lookups
+class OpeningBook:
+    # Params: - path: The book file from build_book
+    def __init__(self, path):
+        self.file = open(path, "rb")
+        self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, version, _ = HEADER.unpack_from(self.map, 0)
+        if magic != BOOK_MAGIC or version != BOOK_VERSION:
+            self.close()
+            raise ValueError(f"{path} isn't an opening book of version {BOOK_VERSION}")
+        self.count = (len(self.map) - HEADER.size) // ENTRY.size
+
+    # Fn: key_at()
+    # Brief: Reads the key of an entry
+    def key_at(self, index):
+        return KEY.unpack_from(self.map, HEADER.size + index * ENTRY.size)[0]
+
+    # Fn: probe()
+    # Brief: Finds the moves the book has for a position
+    # Params: - key: The zobrist key of the position
+    # Return: List of tuples of the packed move and its weight, empty if the position isn't in the book
+    def probe(self, key):
+        # Binary search for the first entry with the key
+        low, high = 0, self.count
+        while low < high:
+            middle = (low + high) // 2
+            if self.key_at(middle) < key:
+                low = middle + 1
+            else:
+                high = middle
+
+        moves = []
+        while low < self.count:
+            entry_key, move, weight = ENTRY.unpack_from(self.map, HEADER.size + low * ENTRY.size)
+            if entry_key != key:
+                break
+            moves.append((move, weight))
+            low += 1
+        return moves
+
+    # Fn: pick_move()
+    # Brief: Picks a book move for a position at random, moves with more weight are picked more often
+    # Params: - position: The Position to find a move for
+    #         - rng: The random number generator to pick with
+    # Return: The packed move, None if the book has no legal move for the position
+    def pick_move(self, position, rng=random):
+        # The moves are checked against the legal ones in case another position has the same key
+        legal = position.generate_moves(position.active_player, MoveList())
+        moves = [(move, weight) for move, weight in self.probe(position.hash) if move in legal]
+        if len(moves) == 0:
+            return None
+        return rng.choices([move for move, _ in moves], weights=[weight for _, weight in moves])[0]
+
+    # Fn: close()
+    # Brief: Unmaps and closes the book file
+    def close(self):
+        self.map.close()
+        self.file.close()
+
+def main():
+    parser = argparse.ArgumentParser(description="Builds and looks up opening books")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    build_parser = commands.add_parser("build", help="Builds a book from PGN files, such as the ones self_play writes")
+    build_parser.add_argument("pgn", nargs="+", help="The PGN files to read")
+    build_parser.add_argument("--output", "-o", default="book.bin", help="The book file to write")
+    build_parser.add_argument("--max-ply", type=int, default=BOOK_MAX_PLY, help="How far into each game to go")
+    build_parser.add_argument("--min-games", type=int, default=1, help="Leave out moves played in fewer games than this")
+
+    probe_parser = commands.add_parser("probe", help="Prints the book moves of a position")
+    probe_parser.add_argument("book", help="The book file")
+    probe_parser.add_argument("--fen", default=START_FEN, help="The position, the starting position if not given")
+    args = parser.parse_args()
+
+    if args.command == "build":
+        stats = build_book(args.pgn, args.output, args.max_ply, args.min_games)
+        print(f"Read {stats['games']} games, wrote {stats['entries']} moves for {stats['positions']} positions to {args.output}")
+        return 0
+
+    book = OpeningBook(args.book)
+    position = Position()
+    position.load_fen(args.fen)
+    moves = book.probe(position.hash)
+    total = sum(weight for _, weight in moves)
+    for move, weight in sorted(moves, key=lambda entry: -entry[1]):
+        print(f"{position.san(move):<8} {move_name(move):<6} {weight:>8} {weight * 100 / total:5.1f}%")
+    if len(moves) == 0:
+        print("Position isn't in the book")
+    book.close()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,160 @@
+import multiprocessing, time
+from concurrent.futures import ProcessPoolExecutor
+from ai import iterative_deepening, is_mate_score
+from chess_position import Position
+from chess_move import MoveList
+from move_ordering import MoveOrderer
+from transposition import TranspositionTable
+from endgame_tables import load_default_tables
+
+# Runs the search in worker processes so it isn't held to one core by the GIL, and so the pygame loop in the main
+# process keeps running while the ai thinks. The legal root moves are split between the workers, each one runs
+# iterative deepening on its share and the best of their results is played. The workers can finish different depths,
+# so their moves are compared at the deepest depth all of them finished
+
+WORKER_TT_SIZE_MB = 32  # Memory budget of the transposition table in each worker
+
+worker_tt = None    # The table of the worker process, kept between searches of the same game for the same color
+worker_tt_root = None   # Tuple of the color and the key of the root of the search the table was last used for
+worker_stop = None  # Shared value holding the id of the newest search told to stop, see engine_worker
+
+# Fn: init_worker()
+# Brief: Runs when each worker process starts, keeps the shared stop value so searches can be stopped from outside the pool
+def init_worker(stop_value):
+    global worker_stop
+    worker_stop = stop_value
+
+# Fn: make_executor()
+# Brief: Starts a pool of worker processes, shared by the parallel search, self play and perft. The processes are
+# spawned rather than forked so they don't inherit the pygame window or the threads of the main process
+# Params: - workers: The number of processes
+#         - stop_value: Shared multiprocessing value the searches poll to know when to stop, None if they can't be stopped
+# Return: The ProcessPoolExecutor
+def make_executor(workers, stop_value=None):
+    if stop_value is None:
+        return ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context("spawn"))
+    return ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context("spawn"), initializer=init_worker,
+                               initargs=(stop_value,))
+
+# Fn: search_root_moves()
+# Brief: The job each worker runs, searches the position with only some of the root moves
+# Params: - compact: The position packed by Position.to_compact
+#         - root_moves: The packed moves this worker searches at the root
+#         - maximizing_color, time_limit, node_limit, max_depth: Passed to ai.iterative_deepening
+#         - settings: Dictionary of the selective search switches passed to ai.iterative_deepening
+#         - search_id: The id the search is stopped by, None if it can't be stopped
+# Return: Tuple of the SearchResult of the worker and the list of SearchInfos of every iteration it finished
+def search_root_moves(compact, root_moves, maximizing_color, time_limit, node_limit, max_depth, settings, search_id=None):
+    global worker_tt, worker_tt_root
+    if worker_tt is None:
+        worker_tt = TranspositionTable(WORKER_TT_SIZE_MB)
+    # The stored scores are from the maximizing color, and a position that doesn't follow on from the last one searched
+    # is from another game, such as the next position of an EPD suite. Either way the entries can't be reused
+    if worker_tt_root is not None and (worker_tt_root[0] != maximizing_color or (
+            worker_tt_root[1] != compact.hash and all(record.hash != worker_tt_root[1] for record in compact.past_moves))):
+        worker_tt.clear()
+    worker_tt_root = (maximizing_color, compact.hash)
+    worker_tt.new_search()
+
+    stop = None
+    if worker_stop is not None and search_id is not None:
+        stop = lambda: worker_stop.value >= search_id
+
+    position = Position.from_compact(compact)
+    iterations = []
+    result = iterative_deepening(position, maximizing_color, time_limit, node_limit, max_depth, worker_tt,
+                                 root_moves=root_moves, stop=stop, on_iteration=iterations.append,
+                                 endgame_tables=load_default_tables(), **settings)
+    return result, iterations
+
+# Fn: split_root_moves()
+# Brief: Orders the legal root moves and deals them out one at a time, so every worker gets some of the moves
+# that are likely to be best instead of one worker getting all of them
+# Params: - position: The position being searched
+#         - workers: How many shares to split the moves into
+# Return: List of lists of packed moves, there are fewer lists than workers when there are fewer moves
+def split_root_moves(position, workers):
+    moves = MoveOrderer().order_moves(position, position.generate_moves(position.active_player, MoveList()), 0)
+    return [moves[i::workers] for i in range(workers) if len(moves[i::workers]) > 0]
+
+# Fn: merge_results()
+# Brief: Picks the best move of the workers, the counters of every worker are added together. A score only says how
+# good a move is next to scores from the same depth, so the moves are compared at the deepest depth every worker
+# finished. A worker that found a mate stopped there with a score that deeper iterations can't change, so it doesn't
+# hold the others back and its mate counts at any depth
+# Params: - results: The SearchResults of the workers
+#         - iterations: The list of SearchInfos of every iteration each worker finished, in the same order as results
+#         - elapsed: The wall clock time the search took
+# Return: One SearchResult
+def merge_results(results, iterations, elapsed):
+    iterations = [infos for infos in iterations if len(infos) > 0]
+    open_depths = [infos[-1].depth for infos in iterations if not is_mate_score(infos[-1].score)]
+    depth = min(open_depths) if open_depths else max(infos[-1].depth for infos in iterations)
+
+    # The last iteration of each worker at or above that depth, the mates are from shallower ones
+    candidates = [next(info for info in reversed(infos) if info.depth <= depth) for infos in iterations]
+    best = max(candidates, key=lambda info: (len(info.pv) > 0, info.score))
+    return results[0]._replace(
+        best_move=best.pv[0] if best.pv else None,
+        score=best.score,
+        depth=depth,
+        pv=best.pv,
+        nodes=sum(result.nodes for result in results),
+        time=elapsed,
+        first_move_cutoff_rate=sum(result.first_move_cutoff_rate for result in results) / len(results),
+        null_move_cutoffs=sum(result.null_move_cutoffs for result in results),
+        reductions=sum(result.reductions for result in results),
+        re_searches=sum(result.re_searches for result in results),
+        pvs_re_searches=sum(result.pvs_re_searches for result in results),
+        aspiration_re_searches=sum(result.aspiration_re_searches for result in results)
+    )
+
+class ParallelSearch:
+    # Params: - workers: The number of processes to split the search across
+    #         - executor: A pool from make_executor to share, one is started on the first search if not given
+    #         - stop_value: Shared value the pool started here polls to know when to stop a search, see engine_worker
+    def __init__(self, workers, executor=None, stop_value=None):
+        self.workers = workers
+        self.executor = executor
+        self.stop_value = stop_value
+
+    # Fn: get_executor()
+    # Brief: Starts the pool of worker processes if it isn't running
+    def get_executor(self):
+        if self.executor is None:
+            self.executor = make_executor(self.workers, self.stop_value)
+        return self.executor
+
+    # Fn: search()
+    # Brief: Searches a position across the worker processes
+    # Params: - position: The Position to search, it's left unchanged
+    #         - maximizing_color: The color the search is finding a move for
+    #         - time_limit: Seconds every worker can take, they run at the same time so it's also the wall clock time
+    #         - node_limit: Nodes for the whole search, split evenly between the workers
+    #         - max_depth: The deepest iteration to run
+    #         - search_id: The id the search can be stopped by through the stop value, None if it can't be
+    #         - settings: The selective search switches of ai.iterative_deepening (null_move, lmr, pvs, aspiration)
+    # Return: SearchResult with the move to play
+    def search(self, position, maximizing_color, time_limit=None, node_limit=None, max_depth=64, search_id=None, **settings):
+        start = time.perf_counter()
+        shares = split_root_moves(position, self.workers)
+        if len(shares) == 0:
+            # No legal moves, there's nothing to split
+            return iterative_deepening(position.copy(), maximizing_color, time_limit, node_limit, max_depth,
+                                       endgame_tables=load_default_tables(), **settings)
+
+        compact = position.to_compact()
+        worker_node_limit = node_limit // len(shares) if node_limit is not None else None
+        executor = self.get_executor()
+        futures = [executor.submit(search_root_moves, compact, share, maximizing_color, time_limit, worker_node_limit,
+                                   max_depth, settings, search_id) for share in shares]
+        finished = [future.result() for future in futures]
+        return merge_results([result for result, _ in finished], [iterations for _, iterations in finished],
+                             time.perf_counter() - start)
+
+    # Fn: shutdown()
+    # Brief: Stops the worker processes
+    def shutdown(self):
+        if self.executor is not None:
+            self.executor.shutdown(cancel_futures=True)
+            self.executor = None
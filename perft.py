@@ -0,0 +1,151 @@
+import argparse, sys, time
+from chess_position import Position, START_FEN
+from chess_move import MoveList, move_name
+from parallel_search import make_executor
+
+# Reference leaf counts for a standard set of positions, the list holds the count for depth 1, 2, 3 and so on.
+# Kiwipete and positions 3 to 5 cover castling, en passant and the checks and pins around them
+PERFT_SUITE = [
+    ("start", START_FEN, [20, 400, 8902, 197281]),
+    ("kiwipete", "r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1", [48, 2039, 97862]),
+    ("position 3", "8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1", [14, 191, 2812, 43238]),
+    ("position 4", "r3k2r/Pppp1ppp/1b3nbN/nP6/BBP1P3/q4N2/Pp1P2PP/R2Q1RK1 w kq - 0 1", [6, 264, 9467]),
+    ("position 5", "rnbq1k1r/pp1Pbppp/2p5/8/2B5/8/PPP1NnPP/RNBQK2R w KQ - 1 8", [44, 1486, 62379]),
+    ("position 6", "r4rk1/1pp1qppp/p1np1n2/2b1p1B1/2B1P1b1/P1NP1N2/1PP1QPPP/R4RK1 w - - 0 10", [46, 2079, 89890]),
+    ("promotions", "n1n5/PPPk4/8/8/8/8/4Kppp/5N1N b - - 0 1", [24, 496, 9483, 182838])
+]
+
+# Fn: perft()
+# Brief: Counts the leaf nodes of the legal move tree to a depth, the last ply is counted straight from
+# the length of the move list instead of making each move
+# Params: - position: The Position to count from, it's left unchanged
+#         - depth: How many plies to count to
+#         - move_lists: A MoveList for every depth, made if not given
+# Return: The number of leaf nodes
+def perft(position, depth, move_lists=None):
+    if depth == 0:
+        return 1
+    if move_lists is None:
+        move_lists = [MoveList() for _ in range(depth + 1)]
+
+    moves = position.generate_moves(position.active_player, move_lists[depth])
+    if depth == 1:
+        return moves.count
+
+    nodes = 0
+    for i in range(moves.count):
+        position.make_move(moves.moves[i])
+        nodes += perft(position, depth - 1, move_lists)
+        position.unmake_move()
+    return nodes
+
+# Fn: divide()
+# Brief: Runs perft below each legal move of the position separately, comparing the split against another
+# engine is how a wrong count gets narrowed down to the move generating it
+# Params: - position: The Position to count from, it's left unchanged
+#         - depth: How many plies to count to, including the root move
+# Return: List of tuples of the packed move and its leaf count
+def divide(position, depth):
+    move_lists = [MoveList() for _ in range(depth + 1)]
+    results = []
+    for move in position.generate_moves(position.active_player, MoveList()).to_list():
+        position.make_move(move)
+        results.append((move, perft(position, depth - 1, move_lists)))
+        position.unmake_move()
+    return results
+
+# Fn: perft_after_move()
+# Brief: The job each worker process runs for parallel_divide, counts the tree below one root move
+# Params: - compact: The position packed by Position.to_compact
+#         - move: The packed root move
+#         - depth: How many plies to count to, including the root move
+# Return: Tuple of the move and its leaf count
+def perft_after_move(compact, move, depth):
+    position = Position.from_compact(compact)
+    position.make_move(move)
+    return move, perft(position, depth - 1)
+
+# Fn: parallel_divide()
+# Brief: The same split as divide but each root move is counted in a worker process of the pool
+# Params: - position: The Position to count from
+#         - depth: How many plies to count to, including the root move
+#         - executor: The pool from parallel_search.make_executor
+# Return: List of tuples of the packed move and its leaf count
+def parallel_divide(position, depth, executor):
+    compact = position.to_compact()
+    moves = position.generate_moves(position.active_player, MoveList()).to_list()
+    return list(executor.map(perft_after_move, [compact] * len(moves), moves, [depth] * len(moves)))
+
+# Fn: timed_perft()
+# Brief: Runs perft and times it
+# Params: - executor: Pool to split the root moves across, perft runs in this process if it's None
+# Return: Tuple of the leaf count and the seconds it took
+def timed_perft(position, depth, executor=None):
+    start = time.perf_counter()
+    if executor is not None and depth > 1:
+        nodes = sum(nodes for _, nodes in parallel_divide(position, depth, executor))
+    else:
+        nodes = perft(position, depth)
+    return nodes, time.perf_counter() - start
+
+# Fn: run_suite()
+# Brief: Runs perft on every position of PERFT_SUITE and checks the counts against the reference ones
+# Params: - max_depth: The deepest depth to run for each position, None for every depth with a reference count
+#         - executor: Pool to split each count across, None to count in this process
+# Return: Boolean if every count matched
+def run_suite(max_depth=None, executor=None):
+    passed = True
+    total_nodes = 0
+    total_time = 0
+    for name, fen, counts in PERFT_SUITE:
+        position = Position()
+        position.load_fen(fen)
+        for depth, expected in enumerate(counts, start=1):
+            if max_depth is not None and depth > max_depth:
+                break
+            nodes, seconds = timed_perft(position, depth, executor)
+            total_nodes += nodes
+            total_time += seconds
+            status = "ok" if nodes == expected else "FAIL"
+            passed = passed and nodes == expected
+            print(f"{name:<12} depth {depth}: {nodes:>9} / {expected:>9} {status:<4} "
+                  f"{seconds:7.2f}s {nodes / seconds if seconds else 0:>10.0f} nps")
+
+    print(f"{'passed' if passed else 'FAILED'}, {total_nodes} nodes in {total_time:.2f}s "
+          f"({total_nodes / total_time if total_time else 0:.0f} nps)")
+    return passed
+
+def main():
+    parser = argparse.ArgumentParser(description="Counts the legal move tree of positions to check and time the move generator")
+    parser.add_argument("--fen", help="Position to count, runs the reference suite if not given")
+    parser.add_argument("--depth", type=int, help="Depth to count to, for the suite it's the deepest depth run")
+    parser.add_argument("--divide", action="store_true", help="Print the count below each root move")
+    parser.add_argument("--workers", type=int, default=1, help="Processes to split the root moves across")
+    args = parser.parse_args()
+
+    executor = make_executor(args.workers) if args.workers > 1 else None
+    try:
+        if args.fen is None:
+            return 0 if run_suite(args.depth, executor) else 1
+
+        depth = args.depth if args.depth is not None else 1
+        position = Position()
+        position.load_fen(args.fen)
+        if args.divide:
+            start = time.perf_counter()
+            results = parallel_divide(position, depth, executor) if executor is not None else divide(position, depth)
+            seconds = time.perf_counter() - start
+            for move, nodes in sorted(results, key=lambda result: move_name(result[0])):
+                print(f"{move_name(move)}: {nodes}")
+            nodes = sum(nodes for _, nodes in results)
+        else:
+            nodes, seconds = timed_perft(position, depth, executor)
+
+        print(f"Nodes: {nodes} in {seconds:.2f}s ({nodes / seconds if seconds else 0:.0f} nps)")
+        return 0
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
+if __name__ == "__main__":
+    sys.exit(main())
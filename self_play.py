@@ -0,0 +1,214 @@
+import argparse, csv, os, random, sys, time
+from concurrent.futures import as_completed
+from datetime import date
+from ai import iterative_deepening
+from chess_position import Position, START_FEN
+from chess_piece import EMPTY, KNIGHT, BISHOP, KING, TYPE_MASK
+from chess_move import MoveList
+from transposition import TranspositionTable
+from parallel_search import make_executor
+from endgame_tables import load_default_tables
+
+# Plays the engine against itself across the worker processes of a pool, for regression testing and tuning.
+# Every finished game is written to the PGN and CSV files as soon as it comes back so a long run can be
+# stopped at any point without losing the games already played
+
+GAME_TT_SIZE_MB = 8     # Memory budget of each sides transposition table, a new pair is made for every game
+CSV_FIELDS = ["game", "result", "termination", "plies", "white_nodes", "black_nodes", "search_time", "nps", "worker"]
+
+# Fn: insufficient_material()
+# Brief: Checks if neither side has enough material left to checkmate, a king against a king and at most one minor piece
+def insufficient_material(position):
+    pieces = [piece & TYPE_MASK for piece in position.squares if piece != EMPTY and piece & TYPE_MASK != KING]
+    return len(pieces) == 0 or (len(pieces) == 1 and pieces[0] in (KNIGHT, BISHOP))
+
+# Fn: play_game()
+# Brief: The job each worker runs, plays one game of the engine against itself from the starting position
+# Params: - game_number: The number of the game, also picks the random opening moves
+#         - depth: The depth each move is searched to, ignored if time_limit is given
+#         - time_limit: Seconds per move, None to search to a fixed depth
+#         - max_plies: The game is a draw once this many moves have been made
+#         - random_plies: How many moves at the start are picked at random so that the games differ
+#         - seed: Seed for the random opening moves
+# Return: Dictionary describing the game, with the moves in SAN
+def play_game(game_number, depth, time_limit, max_plies, random_plies, seed):
+    rng = random.Random(seed * 100003 + game_number)
+    position = Position()
+    position.load_fen(START_FEN)
+    tables = {"w": TranspositionTable(GAME_TT_SIZE_MB), "b": TranspositionTable(GAME_TT_SIZE_MB)}
+    nodes = {"w": 0, "b": 0}
+    search_time = 0
+    sans = []
+    seen = {position.hash: 1}
+    move_list = MoveList()
+
+    while True:
+        color = position.active_player
+        moves = position.generate_moves(color, move_list)
+        if moves.count == 0:
+            if position.in_check(color):
+                result, termination = ("0-1" if color == "w" else "1-0"), "checkmate"
+            else:
+                result, termination = "1/2-1/2", "stalemate"
+            break
+        if insufficient_material(position):
+            result, termination = "1/2-1/2", "insufficient material"
+            break
+        if position.halfmove_clock >= 100:
+            result, termination = "1/2-1/2", "fifty move rule"
+            break
+        if seen[position.hash] >= 3:
+            result, termination = "1/2-1/2", "threefold repetition"
+            break
+        if len(sans) >= max_plies:
+            result, termination = "1/2-1/2", "move limit"
+            break
+
+        if len(sans) < random_plies:
+            move = rng.choice(moves.to_list())
+        else:
+            tables[color].new_search()
+            search = iterative_deepening(position, color, time_limit, None, depth if time_limit is None else 64, tables[color],
+                                         endgame_tables=load_default_tables())
+            move = search.best_move
+            nodes[color] += search.nodes
+            search_time += search.time
+
+        sans.append(position.san(move))
+        position.make_move(move)
+        seen[position.hash] = seen.get(position.hash, 0) + 1
+
+    return {
+        "game": game_number,
+        "result": result,
+        "termination": termination,
+        "plies": len(sans),
+        "white_nodes": nodes["w"],
+        "black_nodes": nodes["b"],
+        "search_time": round(search_time, 3),
+        "nps": round((nodes["w"] + nodes["b"]) / search_time) if search_time else 0,
+        "worker": os.getpid(),
+        "moves": sans
+    }
+
+# Fn: format_pgn()
+# Brief: Writes a finished game as a PGN record
+# Params: - game: The dictionary from play_game
+#         - player: The name used for both players
+# Return: The PGN text
+def format_pgn(game, player):
+    headers = [
+        ("Event", "Self play"),
+        ("Site", "?"),
+        ("Date", date.today().strftime("%Y.%m.%d")),
+        ("Round", str(game["game"])),
+        ("White", player),
+        ("Black", player),
+        ("Result", game["result"]),
+        ("Termination", game["termination"]),
+        ("PlyCount", str(game["plies"]))
+    ]
+    text = "".join(f'[{name} "{value}"]\n' for name, value in headers) + "\n"
+
+    tokens = []
+    for ply, san in enumerate(game["moves"]):
+        if ply % 2 == 0:
+            tokens.append(f"{ply // 2 + 1}.")
+        tokens.append(san)
+    tokens.append(game["result"])
+
+    # Movetext lines are kept under 80 characters
+    line = ""
+    for token in tokens:
+        if len(line) + len(token) + 1 > 79:
+            text += line + "\n"
+            line = token
+        else:
+            line = f"{line} {token}" if line else token
+    return text + line + "\n\n"
+
+# Fn: run_self_play()
+# Brief: Plays the games across a pool of worker processes, streaming each one to the files as it finishes
+# Params: - games: How many games to play
+#         - executor: The pool from parallel_search.make_executor
+#         - pgn_path, csv_path: Files the games are appended to, None to skip one
+#         - the rest are passed to play_game
+# Return: Dictionary of totals, including the games per hour and the nodes per second of each worker
+def run_self_play(games, executor, pgn_path=None, csv_path=None, depth=3, time_limit=None, max_plies=200,
+                  random_plies=4, seed=0):
+    player = f"ai {time_limit}s per move" if time_limit is not None else f"ai depth {depth}"
+    pgn_file = open(pgn_path, "a") if pgn_path else None
+    csv_file = open(csv_path, "a", newline="") if csv_path else None
+    csv_writer = None
+    if csv_file is not None:
+        csv_writer = csv.DictWriter(csv_file, CSV_FIELDS, extrasaction="ignore")
+        if csv_file.tell() == 0:
+            csv_writer.writeheader()
+
+    start = time.perf_counter()
+    results = {"1-0": 0, "0-1": 0, "1/2-1/2": 0}
+    workers = {}    # pid -> [nodes, seconds searching]
+    try:
+        futures = [executor.submit(play_game, game_number, depth, time_limit, max_plies, random_plies, seed)
+                   for game_number in range(1, games + 1)]
+        for finished, future in enumerate(as_completed(futures), start=1):
+            game = future.result()
+            results[game["result"]] += 1
+            worker = workers.setdefault(game["worker"], [0, 0])
+            worker[0] += game["white_nodes"] + game["black_nodes"]
+            worker[1] += game["search_time"]
+
+            if pgn_file is not None:
+                pgn_file.write(format_pgn(game, player))
+                pgn_file.flush()
+            if csv_writer is not None:
+                csv_writer.writerow(game)
+                csv_file.flush()
+
+            elapsed = time.perf_counter() - start
+            print(f"Game {game['game']}: {game['result']} by {game['termination']} in {game['plies']} plies "
+                  f"({finished}/{games}, {finished * 3600 / elapsed:.0f} games/hour)")
+    finally:
+        if pgn_file is not None:
+            pgn_file.close()
+        if csv_file is not None:
+            csv_file.close()
+
+    elapsed = time.perf_counter() - start
+    return {
+        "games": games,
+        "results": results,
+        "seconds": elapsed,
+        "games_per_hour": games * 3600 / elapsed if elapsed else 0,
+        "worker_nps": {pid: nodes / seconds if seconds else 0 for pid, (nodes, seconds) in workers.items()}
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Plays the engine against itself across worker processes")
+    parser.add_argument("--games", type=int, default=10)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--depth", type=int, default=3, help="Fixed search depth per move")
+    parser.add_argument("--time", type=float, help="Seconds per move, used instead of a fixed depth")
+    parser.add_argument("--max-plies", type=int, default=200, help="Games longer than this are drawn")
+    parser.add_argument("--random-plies", type=int, default=4, help="Random moves at the start of each game")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--pgn", default="self_play.pgn", help="PGN file the games are appended to")
+    parser.add_argument("--csv", default="self_play.csv", help="CSV file the results are appended to")
+    args = parser.parse_args()
+
+    executor = make_executor(args.workers)
+    try:
+        summary = run_self_play(args.games, executor, args.pgn, args.csv, args.depth, args.time, args.max_plies,
+                                args.random_plies, args.seed)
+    finally:
+        executor.shutdown()
+
+    results = summary["results"]
+    print(f"{summary['games']} games in {summary['seconds']:.1f}s ({summary['games_per_hour']:.0f} games/hour), "
+          f"white {results['1-0']}, black {results['0-1']}, draws {results['1/2-1/2']}")
+    for pid, nps in summary["worker_nps"].items():
+        print(f"Worker {pid}: {nps:.0f} nodes/sec")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
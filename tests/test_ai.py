@@ -0,0 +1,36 @@
+from ai import SearchState, MATE_SCORE, DELTA_MARGIN, quiesce, evaluate, is_mate_score, capture_gain
+from globals import piece_values
+from chess_position import Position
+
+MATED_FEN = "rnb1kbnr/pppp1ppp/8/4p3/6Pq/5P2/PPPPP2P/RNBQKBNR w KQkq - 1 3"   # Fool's mate, white is mated
+
+def quiesce_state(position, qnodes_left, leaf_plies_above):
+    state = SearchState()
+    state.root_ply = len(position.past_moves)
+    state.qnodes_left = qnodes_left
+    state.qsearch_ply = -leaf_plies_above
+    return state
+
+def test_quiescence_mates_score_the_plies_past_the_leaf():
+    position = Position()
+    position.load_fen(MATED_FEN)
+    near = quiesce(position, -MATE_SCORE * 2, MATE_SCORE * 2, True, "w", quiesce_state(position, 10, 1))
+    far = quiesce(position, -MATE_SCORE * 2, MATE_SCORE * 2, True, "w", quiesce_state(position, 10, 3))
+    assert is_mate_score(near) and is_mate_score(far)
+    assert near == -(MATE_SCORE - 1)
+    assert near < far   # The side being mated prefers the later mate
+
+def test_quiescence_cap_applies_in_check():
+    position = Position()
+    position.load_fen(MATED_FEN)
+    score = quiesce(position, -MATE_SCORE * 2, MATE_SCORE * 2, True, "w", quiesce_state(position, 1, 0))
+    assert score == evaluate(position, "w")
+
+def test_capture_gain_is_what_the_evaluation_can_gain():
+    position = Position()
+    position.load_fen("1r2k3/P7/8/3q4/4P3/8/8/4K3 w - - 0 1")
+    pawn_takes_queen = position.parse_san("exd5")
+    promotes_taking_rook = position.parse_san("axb8=Q")
+    assert capture_gain(position, pawn_takes_queen) == DELTA_MARGIN + piece_values["q"]
+    assert capture_gain(position, promotes_taking_rook) == \
+        DELTA_MARGIN + piece_values["r"] + piece_values["q"] - piece_values["p"]
@@ -0,0 +1,87 @@
+import random
+import pytest
+from chess_piece import QUEEN
+from chess_position import Position
+from chess_move import MoveList
+from endgame_tables import HEADER, TABLE_ENTRY, TABLES_MAGIC, TABLES_VERSION, TABLE_SIZE, SQUARES, EndgameTables
+from endgame_tables import build_table, is_legal
+
+@pytest.fixture(scope="module")
+def kqk(tmp_path_factory):
+    # Only the queen table, written the way build_tables lays out the file
+    values = build_table(QUEEN)
+    path = tmp_path_factory.mktemp("tables") / "kqk.bin"
+    with open(path, "wb") as tables_file:
+        tables_file.write(HEADER.pack(TABLES_MAGIC, TABLES_VERSION, 1))
+        tables_file.write(TABLE_ENTRY.pack(QUEEN, HEADER.size + TABLE_ENTRY.size))
+        tables_file.write(values)
+    tables = EndgameTables(str(path))
+    yield values, tables
+    tables.close()
+
+def probe(tables, fen):
+    position = Position()
+    position.load_fen(fen)
+    return tables.probe(position)
+
+def test_kqk_longest_mate(kqk):
+    values, _ = kqk
+    assert len(values) == TABLE_SIZE
+    assert max(values[:TABLE_SIZE // 2]) - 1 == 19   # Queen side to move
+    assert max(values) - 1 == 20                     # Bare king to move
+
+def test_kqk_known_positions(kqk):
+    _, tables = kqk
+    assert probe(tables, "7k/6Q1/5K2/8/8/8/8/8 b - - 0 1") == ("w", 0)        # Checkmated
+    assert probe(tables, "7k/Q7/5K2/8/8/8/8/8 w - - 0 1") == ("w", 1)         # Qa8 or Qg7 mates
+    assert probe(tables, "7k/5K2/6Q1/8/8/8/8/8 b - - 0 1") == (None, 0)       # Stalemate
+    assert probe(tables, "8/8/8/8/8/5k2/6q1/7K w - - 0 1") == ("b", 0)        # Mirrored for black
+    assert probe(tables, "8/8/8/8/8/5k2/q7/7K b - - 0 1") == ("b", 1)         # Qg2 mates
+    assert probe(tables, "k7/8/8/8/8/8/6q1/7K w - - 0 1") == (None, 0)        # The queen hangs and gets taken
+
+# Fn: fen_for()
+# Brief: The FEN of a table position, the stronger side is white
+def fen_for(weak_to_move, strong_king, weak_king, queen):
+    board = [""] * SQUARES
+    board[strong_king], board[weak_king], board[queen] = "K", "k", "Q"
+    ranks = []
+    for row in range(8):
+        rank, empty = "", 0
+        for char in board[row * 8:row * 8 + 8]:
+            if char == "":
+                empty += 1
+                continue
+            rank += (str(empty) if empty else "") + char
+            empty = 0
+        ranks.append(rank + (str(empty) if empty else ""))
+    return f"{'/'.join(ranks)} {'b' if weak_to_move else 'w'} - - 0 1"
+
+def test_kqk_values_follow_from_the_children(kqk):
+    # A won position is one ply more than its quickest win, a lost one is one more than its slowest loss
+    _, tables = kqk
+    rng = random.Random(5)
+    checked = 0
+    while checked < 2000:
+        weak_to_move, strong_king, weak_king, queen = rng.randrange(2), rng.randrange(SQUARES), rng.randrange(SQUARES), rng.randrange(SQUARES)
+        if not is_legal(QUEEN, weak_to_move, strong_king, weak_king, queen):
+            continue
+        position = Position()
+        position.load_fen(fen_for(weak_to_move, strong_king, weak_king, queen))
+        winner, plies = tables.probe(position)
+        children = []
+        for move in position.generate_moves(position.active_player, MoveList()):
+            position.make_move(move)
+            children.append(tables.probe(position))
+            position.unmake_move()
+
+        wins = [child_plies for child_winner, child_plies in children if child_winner == "w"]
+        if weak_to_move:
+            if winner is None:
+                assert len(children) == 0 or len(wins) < len(children)
+            else:
+                assert plies == (1 + max(wins) if children else 0)
+        elif winner is None:
+            assert len(wins) == 0
+        else:
+            assert plies == 1 + min(wins)
+        checked += 1
@@ -0,0 +1,20 @@
+import random
+from chess_position import Position
+from chess_move import move_name
+from opening_book import OpeningBook, build_book
+
+def test_book_finds_position_given_as_fen(tmp_path):
+    pgn = tmp_path / "games.pgn"
+    pgn.write_text('[Result "0-1"]\n\n1. e4 e5 2. Nf3 Nc6 0-1\n')
+    stats = build_book([str(pgn)], str(tmp_path / "book.bin"))
+    assert stats["games"] == 1
+
+    # The standard FEN after 1.e4 has the en passant square even though no black pawn can take on it
+    position = Position()
+    position.load_fen("rnbqkbnr/pppppppp/8/8/4P3/8/PPPP1PPP/RNBQKBNR b KQkq e3 0 1")
+    book = OpeningBook(str(tmp_path / "book.bin"))
+    try:
+        assert [move_name(move) for move, _ in book.probe(position.hash)] == ["e7e5"]
+        assert move_name(book.pick_move(position, random.Random(0))) == "e7e5"
+    finally:
+        book.close()
@@ -0,0 +1,41 @@
+from ai import SearchResult, SearchInfo, MATE_SCORE
+from parallel_search import merge_results
+
+# Fn: worker()
+# Brief: The result and iterations of a worker whose best move at each depth is given as (move, score) pairs, from depth 1
+def worker(*iterations, nodes=100):
+    infos = [SearchInfo(depth, score, [move, 99], nodes, 1.0) for depth, (move, score) in enumerate(iterations, start=1)]
+    last = infos[-1]
+    return SearchResult(last.pv[0], last.score, last.depth, nodes, 1.0, 0.5, 1, 2, 0, last.pv, 0, 0), infos
+
+def merge(*workers, elapsed=1.0):
+    return merge_results([result for result, _ in workers], [infos for _, infos in workers], elapsed)
+
+def test_merge_compares_the_workers_at_the_depth_they_all_finished():
+    # The first worker's share is simpler so it got deeper, but its move is worse at the depth both reached
+    deep = worker((1, 20), (1, 10), (1, -30), (1, -60), (1, -80), (1, -90))
+    shallow = worker((2, 30), (2, 40), (2, 60), (2, 45), (2, 50))
+    merged = merge(deep, shallow, elapsed=2.0)
+    assert merged.best_move == 2
+    assert merged.score == 50
+    assert merged.depth == 5
+    assert merged.pv == [2, 99]
+    assert merged.nodes == 200
+    assert merged.time == 2.0
+
+def test_merge_uses_the_deeper_workers_score_at_the_common_depth():
+    deep = worker((1, 0), (1, 70), (1, 20), (1, -40))
+    shallow = worker((2, 10), (2, 60))
+    assert merge(deep, shallow).best_move == 1   # 70 against 60 at depth 2
+
+def test_merge_does_not_wait_on_a_worker_that_is_mated():
+    mated = worker((1, 10), (1, -(MATE_SCORE - 3)))
+    other = worker((2, 5), (2, 15), (2, 40), (2, 35))
+    merged = merge(mated, other)
+    assert merged.best_move == 2
+    assert merged.depth == 4
+
+def test_merge_takes_a_mate_from_any_depth():
+    mating = worker((1, 10), (1, MATE_SCORE - 3))
+    other = worker((2, 5), (2, 15), (2, 40), (2, 35), (2, 50), (2, 60))
+    assert merge(mating, other).best_move == 1
@@ -0,0 +1,14 @@
+import pytest
+from chess_position import Position
+from perft import PERFT_SUITE, perft
+
+@pytest.mark.parametrize("name, fen, counts", PERFT_SUITE, ids=[name for name, _, _ in PERFT_SUITE])
+def test_perft_matches_reference_counts(name, fen, counts):
+    position = Position()
+    position.load_fen(fen)
+    key = position.hash
+    for depth, expected in enumerate(counts[:3], start=1):
+        assert perft(position, depth) == expected, f"{name} depth {depth}"
+    # Every move was unmade again
+    assert position.to_fen() == fen
+    assert position.hash == key
@@ -0,0 +1,51 @@
+import pytest
+from chess_position import Position, START_FEN, NO_EN_PASSANT
+from chess_move import square_index
+
+def play(fen, *sans):
+    position = Position()
+    position.load_fen(fen)
+    for san in sans:
+        position.make_move(position.parse_san(san))
+    return position
+
+def load(fen):
+    position = Position()
+    position.load_fen(fen)
+    return position
+
+def test_fen_en_passant_square_without_a_capture_is_dropped():
+    loaded = load("rnbqkbnr/pppppppp/8/8/4P3/8/PPPP1PPP/RNBQKBNR b KQkq e3 0 1")
+    played = play(START_FEN, "e4")
+    assert loaded.en_passant == NO_EN_PASSANT
+    assert loaded.hash == played.hash
+    assert loaded.hash == loaded.compute_hash()
+
+def test_fen_en_passant_square_with_a_capture_is_kept():
+    loaded = load("rnbqkbnr/ppp1pppp/8/8/3pP3/8/PPPP1PPP/RNBQKBNR b KQkq e3 0 1")
+    played = play("rnbqkbnr/ppp1pppp/8/8/3p4/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1", "e4")
+    assert loaded.en_passant == played.en_passant == square_index("e3")
+    assert loaded.hash == played.hash
+
+@pytest.mark.parametrize("fen, field", [
+    ("rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR x KQkq - 0 1", "side to move"),
+    ("rnbqkbnr/pppppppp/9/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1", "piece placement"),
+    ("rnbqkbnr/ppppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1", "piece placement"),
+    ("rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNX w KQkq - 0 1", "piece placement"),
+    ("rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBN w KQkq - 0 1", "piece placement"),
+    ("rnbqkbnr/pppppppp/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1", "piece placement"),
+    ("rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQ1BNR w KQkq - 0 1", "piece placement"),
+    ("rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQxq - 0 1", "castling rights"),
+    ("rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq z9 0 1", "en passant square"),
+    ("rnbqkbnr/pppppppp/8/8/4P3/8/PPPP1PPP/RNBQKBNR b KQkq e6 0 1", "en passant square"),
+    ("rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - x 1", "move clocks"),
+    ("rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1 extra", "fields"),
+    ("rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR", "fields"),
+])
+def test_malformed_fen_names_the_field(fen, field):
+    with pytest.raises(ValueError, match=field):
+        load(fen)
+
+def test_fen_round_trip():
+    fen = "r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 3 7"
+    assert load(fen).to_fen() == fen
@@ -0,0 +1,101 @@
+from collections import namedtuple
+
+# Bound types, an exact score came from a full window, a lower bound from a beta cutoff (the real score is at least this)
+# and an upper bound from a node where no move beat alpha (the real score is at most this)
+EXACT = 0
+LOWER_BOUND = 1
+UPPER_BOUND = 2
+
+# Rough size of one stored entry in bytes (the namedtuple, its 64 bit key and the slot in the list)
+# used to turn a memory budget into a number of entries
+ENTRY_BYTES = 144
+
+TTEntry = namedtuple("TTEntry", ["key", "depth", "score", "bound", "best_move", "age"])
+
+# A fixed size table of searched positions indexed by the low bits of the zobrist key of the position.
+# When two positions share a slot the one searched to the greater depth is kept, unless it was stored
+# during an older search in which case it's always replaced. Scores are relative to the maximizing color
+# of the search that stored them, so one table should only be used by searches for the same color
+class TranspositionTable:
+    def __init__(self, size_mb=16):
+        # The number of entries is rounded down to a power of two so the index is just a bit mask
+        entries = max(1, (size_mb * 1024 * 1024) // ENTRY_BYTES)
+        self.size = 1 << (entries.bit_length() - 1)
+        self.mask = self.size - 1
+        self.entries = [None] * self.size
+        self.age = 0
+
+        self.reset_stats()
+
+    # Fn: reset_stats()
+    # Brief: Zeroes the counters used for sizing the table
+    def reset_stats(self):
+        self.hits = 0           # The position was found
+        self.misses = 0         # The slot was empty
+        self.collisions = 0     # The slot held a different position
+        self.stores = 0
+        self.overwrites = 0     # A different position was replaced by a store
+
+    # Fn: new_search()
+    # Brief: Marks the entries that are already stored as old so they get replaced first, and resets the counters
+    def new_search(self):
+        self.age += 1
+        self.reset_stats()
+
+    # Fn: clear()
+    # Brief: Empties every slot of the table
+    def clear(self):
+        self.entries = [None] * self.size
+        self.reset_stats()
+
+    # Fn: probe()
+    # Brief: Looks up a position in the table
+    # Params: - key: The zobrist key of the position
+    # Return: The TTEntry for the position, or None if it isn't stored
+    def probe(self, key):
+        entry = self.entries[key & self.mask]
+        if entry is None:
+            self.misses += 1
+            return None
+        if entry.key != key:
+            self.collisions += 1
+            return None
+        self.hits += 1
+        return entry
+
+    # Fn: store()
+    # Brief: Saves the result of searching a position, following the replace by depth scheme
+    # Params: - key: The zobrist key of the position
+    #         - depth: The depth the position was searched to
+    #         - score: The score of the search
+    #         - bound: EXACT, LOWER_BOUND or UPPER_BOUND
+    #         - best_move: The best move found, None if there wasn't one
+    def store(self, key, depth, score, bound, best_move):
+        index = key & self.mask
+        entry = self.entries[index]
+        # A deeper result from the current search is worth more than this one
+        if entry is not None and entry.age == self.age and depth < entry.depth:
+            return
+
+        if entry is not None and entry.key != key:
+            self.overwrites += 1
+        self.stores += 1
+        self.entries[index] = TTEntry(key, depth, score, bound, best_move, self.age)
+
+    # Fn: get_stats()
+    # Brief: Gathers the counters together with how full the table is, sampling the first slots to keep it cheap
+    # Return: Dictionary of the counters
+    def get_stats(self):
+        probes = self.hits + self.misses + self.collisions
+        sample = self.entries[:min(self.size, 1000)]
+        return {
+            "size": self.size,
+            "size_mb": self.size * ENTRY_BYTES / (1024 * 1024),
+            "hits": self.hits,
+            "misses": self.misses,
+            "collisions": self.collisions,
+            "hit_rate": self.hits / probes if probes else 0.0,
+            "stores": self.stores,
+            "overwrites": self.overwrites,
+            "fill": sum(entry is not None for entry in sample) / len(sample)
+        }